@@ -1,29 +1,54 @@
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.openapi.utils import get_openapi
 from src.api.v1.auth import router as auth_router
 from src.api.v1.user import router as user_router
 from src.api.v1.chatroom import router as chatroom_router
 from src.api.v1.subscription import router as subscription_router
+from src.api.v1.admin import router as admin_router
+from src.utils.profiling import install_request_profiler
+from src.utils.execution import execution_backend
+from src.utils.traffic import install_traffic_capture
+from src.core.config import settings
 
 from src.models.user import User
 from src.models.chatroom import Chatroom, Message
+from src.models.usage import UsageRollup, TierUsageRollup
 
 
 from src.database.session import engine
+from src.database.sharding import shard_router
 from src.database.base import Base
 
 Base.metadata.create_all(bind=engine)
+for shard_engine in shard_router.engines:
+    Base.metadata.create_all(bind=shard_engine)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Inline execution runs Gemini tasks on this loop; drain them before exiting
+    await execution_backend.start()
+    yield
+    await execution_backend.drain(settings.INLINE_DRAIN_SECONDS)
 
 app = FastAPI(
     title="Gemini Backend Clone - Kuvaka Tech",
     version="1.0.0",
-    description="OTP + JWT Auth, Async Gemini API, Stripe Subscriptions"
+    description="OTP + JWT Auth, Async Gemini API, Stripe Subscriptions",
+    lifespan=lifespan
 )
 
 app.include_router(auth_router)
 app.include_router(user_router)
 app.include_router(chatroom_router)
 app.include_router(subscription_router)
+app.include_router(admin_router)
+
+# Opt-in profiling: PROFILE_SAMPLE_RATE and/or PROFILE_DEBUG_TOKEN
+install_request_profiler(app)
+
+# Opt-in capture of anonymized traffic for load replay: TRAFFIC_CAPTURE_FILE
+install_traffic_capture(app)
 
 # Override OpenAPI schema to fix Swagger UI
 def custom_openapi():
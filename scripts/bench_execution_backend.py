@@ -0,0 +1,82 @@
+# scripts/bench_execution_backend.py
+"""
+Measures end-to-end reply latency — from POST /chatroom/{id}/message until the
+assistant's reply can be read — against a running instance.
+
+    GEMINI_STUB=true EXECUTION_BACKEND=celery uvicorn app:app   # + worker and relay
+    python scripts/bench_execution_backend.py --messages 50
+
+    GEMINI_STUB=true EXECUTION_BACKEND=inline uvicorn app:app
+    python scripts/bench_execution_backend.py --messages 50
+
+Replies returned inline are timed at the response; otherwise the script polls
+the message list the way a client would. Fresh users are signed up as the Basic
+daily limit runs out.
+"""
+import argparse
+import random
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+import httpx
+
+BASIC_DAILY_MESSAGES = 5
+
+
+def login(client: httpx.Client) -> dict:
+    mobile = f"+1555{random.randint(0, 10 ** 7 - 1):07d}"
+    # Own connection: the signup response is not needed, and an error response may close it
+    httpx.post(client.base_url.join("/auth/signup"), json={"mobile_number": mobile, "password": "bench-password"})
+    otp = client.post("/auth/send-otp", json={"mobile_number": mobile}).json()["otp"]
+    token = client.post("/auth/verify-otp", json={"mobile_number": mobile, "otp": otp}).json()["access_token"]
+    return {"Authorization": f"Bearer {token}"}
+
+
+def reply_latency(client: httpx.Client, headers: dict, chatroom_id: int, poll_ms: int, timeout: float) -> float:
+    start = time.perf_counter()
+    sent = client.post(f"/chatroom/{chatroom_id}/message", json={"content": "What is 2 + 2?"}, headers=headers)
+    sent.raise_for_status()
+    body = sent.json()
+    if body.get("reply"):
+        return time.perf_counter() - start
+
+    while time.perf_counter() - start < timeout:
+        time.sleep(poll_ms / 1000)
+        messages = client.get(f"/chatroom/{chatroom_id}/messages", params={"preview": "true"}, headers=headers).json()
+        if any(not m["is_from_user"] and m["id"] > body["id"] for m in messages):
+            return time.perf_counter() - start
+    raise TimeoutError(f"No reply to message {body['id']} within {timeout}s")
+
+
+def run_user(base_url: str, count: int, poll_ms: int, timeout: float) -> list:
+    with httpx.Client(base_url=base_url, timeout=timeout) as client:
+        headers = login(client)
+        chatroom_id = client.post("/chatroom", json={"name": "bench"}, headers=headers).json()["id"]
+        return [reply_latency(client, headers, chatroom_id, poll_ms, timeout) for _ in range(count)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark end-to-end Gemini reply latency")
+    parser.add_argument("--base-url", default="http://localhost:8000")
+    parser.add_argument("--messages", type=int, default=50)
+    parser.add_argument("--concurrency", type=int, default=1)
+    parser.add_argument("--poll-ms", type=int, default=250, help="client polling interval for 202 responses")
+    parser.add_argument("--timeout", type=float, default=60)
+    args = parser.parse_args()
+
+    batches = [BASIC_DAILY_MESSAGES] * (args.messages // BASIC_DAILY_MESSAGES)
+    if args.messages % BASIC_DAILY_MESSAGES:
+        batches.append(args.messages % BASIC_DAILY_MESSAGES)
+
+    with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        results = pool.map(lambda n: run_user(args.base_url, n, args.poll_ms, args.timeout), batches)
+        latencies = sorted(ms * 1000 for batch in results for ms in batch)
+
+    print(f"{len(latencies)} replies, concurrency {args.concurrency}, poll {args.poll_ms} ms")
+    print(f"  median : {statistics.median(latencies):8.1f} ms")
+    print(f"  p95    : {latencies[max(0, int(len(latencies) * 0.95) - 1)]:8.1f} ms")
+    print(f"  max    : {latencies[-1]:8.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,143 @@
+# scripts/bench_message_storage.py
+"""
+Measures compressed message storage against inline storage on a synthetic
+chat corpus shaped like real traffic: short user prompts, long-tailed Gemini
+answers with markdown paragraphs, lists and code blocks.
+
+    python scripts/bench_message_storage.py --messages 20000 --rooms 50
+
+Builds two SQLite databases (everything inline vs. the current
+MESSAGE_COMPRESSION_THRESHOLD) and reports database size, stored body bytes,
+and list latency/payload for full and preview listings.
+"""
+import argparse
+import json
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+# Add project root to Python path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import create_engine, func, text
+from sqlalchemy.orm import sessionmaker, selectinload
+from src.core.config import settings
+from src.database.base import Base
+from src.models import User, Chatroom, Message, MessageBody
+from src.utils.compression import make_preview
+
+WORDS = (
+    "the model request response database query index cache latency user message chat room "
+    "token prompt answer example function value system data python server client error "
+    "performance memory storage network configuration deploy service worker queue task result "
+    "because however therefore first second finally simple important consider following using"
+).split()
+
+
+def _sentence(rng):
+    words = [rng.choice(WORDS) for _ in range(rng.randint(6, 18))]
+    return " ".join(words).capitalize() + "."
+
+
+def _ai_answer(rng):
+    # Lognormal sizes: median ~1.5 KB, long tail past 20 KB
+    target = int(min(rng.lognormvariate(7.3, 0.9), 40000))
+    parts = []
+    while sum(len(p) for p in parts) < target:
+        kind = rng.random()
+        if kind < 0.6:
+            parts.append(" ".join(_sentence(rng) for _ in range(rng.randint(2, 6))))
+        elif kind < 0.85:
+            parts.append("\n".join(f"- {_sentence(rng)}" for _ in range(rng.randint(3, 7))))
+        else:
+            lines = [f"    {rng.choice(WORDS)} = {rng.choice(WORDS)}({rng.randint(0, 99)})" for _ in range(rng.randint(3, 10))]
+            parts.append("```python\n" + "\n".join(lines) + "\n```")
+    return "\n\n".join(parts)
+
+
+def build(path, threshold, corpus, rooms):
+    settings.MESSAGE_COMPRESSION_THRESHOLD = threshold
+    engine = create_engine(f"sqlite:///{path}")
+    Base.metadata.create_all(bind=engine)
+    db = sessionmaker(bind=engine)()
+    db.add(User(id=1, mobile_number="+10000000000"))
+    db.add_all(Chatroom(id=i + 1, name=f"room {i + 1}", user_id=1) for i in range(rooms))
+    for room_id, is_from_user, body in corpus:
+        message = Message(chatroom_id=room_id, user_id=1, is_from_user=is_from_user)
+        message.set_content(body)
+        db.add(message)
+    db.commit()
+    db.close()
+    with engine.connect() as conn:
+        conn.execute(text("VACUUM"))
+    return engine
+
+
+def stored_bytes(engine):
+    db = sessionmaker(bind=engine)()
+    inline = db.query(func.coalesce(func.sum(func.length(Message.content)), 0)).scalar()
+    compressed = db.query(func.coalesce(func.sum(func.length(MessageBody.data)), 0)).scalar()
+    db.close()
+    return inline + compressed
+
+
+def list_latency(engine, rooms, mode, repeats):
+    """Median ms and mean payload bytes to list one room, including JSON encoding."""
+    Session = sessionmaker(bind=engine)
+    timings, payloads = [], []
+    for _ in range(repeats):
+        for room_id in range(1, rooms + 1):
+            db = Session()
+            start = time.perf_counter()
+            query = db.query(Message).filter(Message.chatroom_id == room_id).order_by(Message.created_at)
+            if mode == "full":
+                query = query.options(selectinload(Message.body))
+                rows = [{"id": m.id, "content": m.full_content} for m in query.all()]
+            else:
+                rows = [{"id": m.id, "content": make_preview(m.content)} for m in query.all()]
+            payload = json.dumps(rows)
+            timings.append((time.perf_counter() - start) * 1000)
+            payloads.append(len(payload))
+            db.close()
+    return statistics.median(timings), statistics.mean(payloads)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark compressed message storage")
+    parser.add_argument("--messages", type=int, default=20000)
+    parser.add_argument("--rooms", type=int, default=50)
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    corpus = []
+    for i in range(args.messages):
+        room_id = rng.randint(1, args.rooms)
+        if i % 2 == 0:
+            corpus.append((room_id, True, " ".join(_sentence(rng) for _ in range(rng.randint(1, 4)))))
+        else:
+            corpus.append((room_id, False, _ai_answer(rng)))
+    raw = sum(len(body.encode("utf-8")) for _, _, body in corpus)
+    print(f"Corpus: {args.messages} messages, {raw / 1e6:.1f} MB of text, {args.rooms} rooms")
+
+    threshold = settings.MESSAGE_COMPRESSION_THRESHOLD
+    with tempfile.TemporaryDirectory() as tmp:
+        inline = build(os.path.join(tmp, "inline.db"), 10 ** 12, corpus, args.rooms)
+        compressed = build(os.path.join(tmp, "compressed.db"), threshold, corpus, args.rooms)
+
+        for name, engine in (("inline", inline), (f"compressed (>= {threshold} B)", compressed)):
+            size = os.path.getsize(engine.url.database)
+            print(f"\n{name}")
+            print(f"  database file : {size / 1e6:8.2f} MB")
+            print(f"  body bytes    : {stored_bytes(engine) / 1e6:8.2f} MB")
+            for mode in ("full", "preview"):
+                ms, payload = list_latency(engine, args.rooms, mode, args.repeats)
+                print(f"  list {mode:<8} : {ms:8.2f} ms median, {payload / 1e3:8.1f} KB payload per room")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+# scripts/bench_vector_index.py
+"""
+Measures vector index lookups on one large synthetic chatroom.
+
+    python scripts/bench_vector_index.py --messages 100000 --queries 200
+
+Indexes --messages synthetic turns with the configured embedder, then reports
+median / p99 search latency (query embedding excluded, it is paid once per
+task) and recall@k of the SimHash candidate pass against exact search.
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+# Add project root to Python path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.core.config import settings
+from src.utils import vector_index
+from src.utils.embeddings import get_embedder
+from src.utils.vector_index import VectorIndex
+
+FILLER = "i the a to and is it my for of in you can what how about with this that".split()
+VOCABULARY = [f"w{i}" for i in range(5000)]
+
+
+def _topics(rng, count=500):
+    # Chats circle around topics: each turn mixes one topic's words with filler
+    return [rng.sample(VOCABULARY, 12) for _ in range(count)]
+
+
+def _turn(rng, topics):
+    topic = rng.choice(topics)
+    return " ".join(rng.choice(topic if rng.random() < 0.5 else FILLER) for _ in range(rng.randint(5, 25)))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark vector index search")
+    parser.add_argument("--messages", type=int, default=100000)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=settings.PROMPT_RETRIEVED_MESSAGES)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    embedder = get_embedder()
+    with tempfile.TemporaryDirectory() as tmp:
+        index = VectorIndex(tmp, embedder.dim)
+        topics = _topics(rng)
+        start = time.perf_counter()
+        for offset in range(0, args.messages, 5000):
+            batch = [_turn(rng, topics) for _ in range(min(5000, args.messages - offset))]
+            index.add(1, 1, list(range(offset + 1, offset + len(batch) + 1)), embedder.embed(batch))
+        print(f"Indexed {args.messages} messages in {time.perf_counter() - start:.1f}s "
+              f"({embedder.dim}-dim, {index.count(1, 1)} rows)")
+
+        queries = embedder.embed([_turn(rng, topics) for _ in range(args.queries)])
+        index.search(1, 1, queries[0], args.k)  # warm the page cache
+
+        timings, approx = [], []
+        for query in queries:
+            start = time.perf_counter()
+            approx.append(index.search(1, 1, query, args.k))
+            timings.append((time.perf_counter() - start) * 1000)
+
+        # Exact search for recall, in a separate pass so its full scans don't evict the timed one
+        vector_index.EXACT_SEARCH_ROWS = args.messages
+        # A hit is any result scoring at least the exact k-th best; many rows tie on topical text
+        hits = 0
+        for query, found in zip(queries, approx):
+            kth = index.search(1, 1, query, args.k)[-1][1]
+            hits += sum(score >= kth - 1e-6 for _, score in found)
+
+        timings.sort()
+        print(f"search : {statistics.median(timings):.3f} ms median, "
+              f"{timings[int(len(timings) * 0.99) - 1]:.3f} ms p99")
+        print(f"recall@{args.k}: {hits / (args.k * len(queries)):.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,129 @@
+# scripts/migrate_schema.py
+"""
+Brings an existing database up to the current models.
+
+    python scripts/migrate_schema.py
+
+The app only runs create_all, which creates missing tables but never alters
+existing ones. This adds the columns and indexes introduced since the tables
+first shipped, on DATABASE_URL and every shard in SHARD_DATABASE_URLS. Safe to
+run repeatedly — steps that are already applied are skipped. Run it before
+starting the new version; replicas follow their primaries.
+"""
+import os
+import sys
+
+# Add project root to Python path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import inspect, text
+from src.database.base import Base
+from src.database.session import engine as directory_engine
+from src.database.sharding import shard_router
+import src.models  # noqa: F401 — registers every table on Base.metadata
+
+# (table, column, DDL) in the order they were introduced
+COLUMNS = [
+    # Sharding
+    ("users", "shard", "INTEGER"),
+    ("users", "shard_locked", "BOOLEAN DEFAULT FALSE"),
+    # Usage rollups
+    ("messages", "prompt_tokens", "INTEGER"),
+    ("messages", "completion_tokens", "INTEGER"),
+    # Compressed message bodies
+    ("messages", "is_compressed", "BOOLEAN NOT NULL DEFAULT FALSE"),
+    ("messages", "content_length", "INTEGER"),
+    # Transactional outbox — duplicate deliveries (index made unique below)
+    ("messages", "reply_to_id", "INTEGER REFERENCES messages(id) ON DELETE SET NULL"),
+    # Chatroom summaries
+    ("chatrooms", "message_count", "INTEGER NOT NULL DEFAULT 0"),
+    ("chatrooms", "last_message_at", "TIMESTAMP"),
+    ("chatrooms", "last_message_preview", "VARCHAR"),
+]
+
+# Existing rooms start with the summary their messages imply
+CHATROOM_SUMMARY_BACKFILL = text("""
+    UPDATE chatrooms SET
+        message_count = (SELECT COUNT(*) FROM messages WHERE messages.chatroom_id = chatrooms.id),
+        last_message_at = (SELECT MAX(created_at) FROM messages WHERE messages.chatroom_id = chatrooms.id),
+        last_message_preview = (
+            SELECT SUBSTR(content, 1, 120) FROM messages
+            WHERE messages.chatroom_id = chatrooms.id
+            ORDER BY messages.id DESC LIMIT 1
+        )
+""")
+
+# Rooms without messages count as active since creation
+EMPTY_ROOM_ACTIVITY_BACKFILL = text("""
+    UPDATE chatrooms SET last_message_at = created_at WHERE last_message_at IS NULL
+""")
+
+# Per-tier totals for periods recorded before the tier table existed
+TIER_USAGE_BACKFILL = text("""
+    INSERT INTO tier_usage_rollups (tier, period, period_start, active_users, message_count,
+                                    prompt_tokens, completion_tokens, total_tokens, updated_at)
+    SELECT tier, period, period_start, COUNT(DISTINCT user_id), SUM(message_count),
+           SUM(prompt_tokens), SUM(completion_tokens), SUM(total_tokens), CURRENT_TIMESTAMP
+    FROM usage_rollups
+    GROUP BY tier, period, period_start
+""")
+
+DETACH_DUPLICATE_REPLIES = text("""
+    UPDATE messages SET reply_to_id = NULL
+    WHERE reply_to_id IS NOT NULL AND id NOT IN (
+        SELECT MIN(id) FROM messages WHERE reply_to_id IS NOT NULL GROUP BY reply_to_id
+    )
+""")
+
+
+def migrate(engine) -> None:
+    print(f"🗄️ Migrating {engine.url!r}")
+    had_tables = set(inspect(engine).get_table_names())
+    Base.metadata.create_all(bind=engine)  # tables that did not exist yet
+
+    with engine.begin() as conn:
+        inspector = inspect(conn)
+        tables = set(inspector.get_table_names())
+        existing = {table: {c["name"] for c in inspector.get_columns(table)} for table in tables}
+
+        added = set()
+        for table, column, ddl in COLUMNS:
+            if table in tables and column not in existing[table]:
+                conn.execute(text(f"ALTER TABLE {table} ADD COLUMN {column} {ddl}"))
+                added.add((table, column))
+                print(f"  ➕ {table}.{column}")
+
+        # reply_to_id became unique: keep the first reply to each message, detach the others
+        indexes = {i["name"]: i for i in inspector.get_indexes("messages")} if "messages" in tables else {}
+        if "ix_messages_reply_to_id" in indexes and not indexes["ix_messages_reply_to_id"]["unique"]:
+            conn.execute(DETACH_DUPLICATE_REPLIES)
+            conn.execute(text("DROP INDEX ix_messages_reply_to_id"))
+            print("  🔁 Made messages.reply_to_id unique")
+
+        if ("chatrooms", "message_count") in added:
+            conn.execute(CHATROOM_SUMMARY_BACKFILL)
+            print("  🔁 Backfilled chatroom summaries")
+        if "usage_rollups" in had_tables and "tier_usage_rollups" not in had_tables:
+            conn.execute(TIER_USAGE_BACKFILL)
+            # Per-tier totals no longer scan usage_rollups by period
+            conn.execute(text("DROP INDEX IF EXISTS ix_usage_rollups_period"))
+            print("  🔁 Backfilled per-tier usage rollups")
+
+        if "chatrooms" in tables and conn.execute(EMPTY_ROOM_ACTIVITY_BACKFILL).rowcount:
+            print("  🔁 Backfilled activity time of empty chatrooms")
+
+        for table in Base.metadata.sorted_tables:
+            if table.name in tables:
+                for index in table.indexes:
+                    index.create(conn, checkfirst=True)
+
+    print("  ✅ Up to date")
+
+
+def main():
+    for engine in [directory_engine, *shard_router.engines]:
+        migrate(engine)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,216 @@
+# scripts/rebalance_shards.py
+"""
+Online copy-and-cutover of a user's chatrooms and messages to another shard.
+
+    python scripts/rebalance_shards.py move --user-id 42 --to-shard 1
+    python scripts/rebalance_shards.py move --user-id 42 --to-shard 1 --from-directory
+    python scripts/rebalance_shards.py backfill    # legacy data in DATABASE_URL -> default shards
+
+A move syncs the user's rows to the target while traffic continues, then locks
+the user (routes answer 503 + Retry-After, tasks retry), waits for in-flight
+requests to drain, syncs the remaining delta, flips User.shard and unlocks.
+Rows keep their ids: with shards configured, new chatrooms, messages and outbox
+rows get ids that are unique across all databases (src/database/ids.py), so the
+copy never collides. Rows written by the database's own sequence before that —
+the pre-sharding data, or shards that ran an older version — can still collide;
+such a move aborts before the cutover and leaves the user where they were.
+"""
+import argparse
+import os
+import sys
+import time
+from collections import defaultdict
+
+# Add project root to Python path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import select
+from sqlalchemy.exc import IntegrityError
+from src.core.config import settings
+from src.database.session import SessionLocal, engine as directory_engine
+from src.database.replicas import ReplicaPool
+from src.database.sharding import shard_router, USER_SCOPED_TABLES
+from src.models import User, Chatroom
+
+
+def _chunks(items, size):
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+
+def _pk(table):
+    return list(table.primary_key.columns)[0]
+
+
+def sync_user(source_engine, target_engine, user, batch_size: int) -> int:
+    """
+    Makes the target's copy of the user's rows match the source in one transaction.
+    Inserts run parents-first, deletes of rows gone from the source children-first.
+    Returns the number of rows changed on the target.
+    """
+    changed = 0
+    stale = []
+    with source_engine.connect() as src, target_engine.begin() as dst:
+        if dst.execute(select(User.id).where(User.id == user.id)).first() is None:
+            dst.execute(User.__table__.insert(), [{"id": user.id, "mobile_number": user.mobile_number}])
+
+        for table, mutable, user_filter in USER_SCOPED_TABLES:
+            pk = _pk(table)
+            where = user_filter(user.id)
+            src_ids = set(src.execute(select(pk).where(where)).scalars())
+            dst_ids = set(dst.execute(select(pk).where(where)).scalars())
+
+            for batch in _chunks(sorted(src_ids - dst_ids), batch_size):
+                rows = src.execute(select(table).where(pk.in_(batch))).mappings().all()
+                dst.execute(table.insert(), [dict(row) for row in rows])
+                changed += len(rows)
+
+            if mutable:
+                for batch in _chunks(sorted(src_ids & dst_ids), batch_size):
+                    for row in src.execute(select(table).where(pk.in_(batch))).mappings():
+                        dst.execute(table.update().where(pk == row[pk.name]).values(**row))
+
+            stale.append((table, sorted(dst_ids - src_ids)))
+
+        for table, ids in reversed(stale):
+            pk = _pk(table)
+            for batch in _chunks(ids, batch_size):
+                dst.execute(table.delete().where(pk.in_(batch)))
+                changed += len(batch)
+
+    return changed
+
+
+def purge_user(engine, user_id: int) -> None:
+    """Deletes the user's rows from a database they no longer live on."""
+    with engine.begin() as conn:
+        for table, _, user_filter in reversed(USER_SCOPED_TABLES):
+            conn.execute(table.delete().where(user_filter(user_id)))
+
+
+def move_user(user_id: int, to_shard: int, from_directory: bool = False, drain_seconds: float = 5.0,
+              batch_size: int = 1000, keep_source: bool = False) -> None:
+    if not shard_router.enabled:
+        raise SystemExit("❌ SHARD_DATABASE_URLS is not configured")
+    if not 0 <= to_shard < len(shard_router.engines):
+        raise SystemExit(f"❌ Shard {to_shard} does not exist")
+
+    db = SessionLocal()
+    try:
+        user = db.query(User).filter(User.id == user_id).first()
+        if not user:
+            raise SystemExit(f"❌ User {user_id} not found")
+        if user.shard_locked:
+            raise SystemExit(f"❌ User {user_id} is already locked — is another move running?")
+
+        if from_directory:
+            source_engine = directory_engine
+        else:
+            from_shard = shard_router.shard_for(user)
+            if from_shard == to_shard:
+                print(f"✅ User {user_id} already lives on shard {to_shard}")
+                return
+            source_engine = shard_router.engines[from_shard]
+        target_engine = shard_router.engines[to_shard]
+
+        # 1. Bulk copy while the user keeps chatting
+        copied = sync_user(source_engine, target_engine, user, batch_size)
+        print(f"📦 Copied {copied} rows for user {user_id}")
+
+        # 2. Lock and let in-flight requests finish on the source. Tasks re-check the
+        #    placement under a row lock before committing, so this waits for any that
+        #    are committing now; later ones see the lock and retry.
+        user.shard_locked = True
+        db.commit()
+        try:
+            time.sleep(drain_seconds)
+
+            # 3. Catch up whatever was written during the bulk copy
+            delta = sync_user(source_engine, target_engine, user, batch_size)
+            print(f"🔁 Synced {delta} delta rows for user {user_id}")
+
+            # 4. Cutover
+            user.shard = to_shard
+        finally:
+            user.shard_locked = False
+            db.commit()
+        print(f"✅ User {user_id} now lives on shard {to_shard}")
+
+        if not keep_source:
+            # Give replicas time to see the new placement before the old rows disappear
+            if ReplicaPool.any_configured:
+                time.sleep(settings.REPLICA_MAX_LAG_SECONDS)
+            purge_user(source_engine, user_id)
+            print(f"🧹 Purged user {user_id} from the source database")
+    except IntegrityError as e:
+        raise SystemExit(f"❌ Row id collision on shard {to_shard}, move aborted: {e.orig}")
+    finally:
+        db.close()
+
+
+def mirror_users(batch_size: int) -> None:
+    """
+    Copies every directory user's identity row to their shard, so chatrooms created
+    later by users who had none at backfill time satisfy the users foreign key.
+    """
+    with directory_engine.connect() as src:
+        users = src.execute(select(User.id, User.mobile_number, User.shard)).all()
+
+    by_shard = defaultdict(list)
+    for user in users:
+        by_shard[user.shard if user.shard is not None else shard_router.default_shard(user.id)].append(user)
+
+    for shard, group in by_shard.items():
+        mirrored = 0
+        with shard_router.engines[shard].begin() as dst:
+            for batch in _chunks(group, batch_size):
+                present = set(dst.execute(select(User.id).where(User.id.in_([u.id for u in batch]))).scalars())
+                missing = [{"id": u.id, "mobile_number": u.mobile_number} for u in batch if u.id not in present]
+                if missing:
+                    dst.execute(User.__table__.insert(), missing)
+                    mirrored += len(missing)
+        print(f"👥 Mirrored {mirrored} users to shard {shard}")
+
+
+def backfill(drain_seconds: float, batch_size: int, keep_source: bool) -> None:
+    """Mirrors every user to their shard, then moves those who still have chatrooms in the directory DB."""
+    mirror_users(batch_size)
+
+    db = SessionLocal()
+    try:
+        user_ids = [row.user_id for row in db.query(Chatroom.user_id).distinct().order_by(Chatroom.user_id)]
+    finally:
+        db.close()
+
+    for user_id in user_ids:
+        move_user(user_id, shard_router.default_shard(user_id), from_directory=True,
+                  drain_seconds=drain_seconds, batch_size=batch_size, keep_source=keep_source)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Move users' chatrooms and messages between shards")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    move = sub.add_parser("move", help="Move one user to a shard")
+    move.add_argument("--user-id", type=int, required=True)
+    move.add_argument("--to-shard", type=int, required=True)
+    move.add_argument("--from-directory", action="store_true",
+                      help="Read the user's rows from DATABASE_URL (pre-sharding data)")
+
+    fill = sub.add_parser("backfill", help="Mirror all users to their shards and move directory-hosted chats")
+
+    for p in (move, fill):
+        p.add_argument("--drain-seconds", type=float, default=5.0)
+        p.add_argument("--batch-size", type=int, default=1000)
+        p.add_argument("--keep-source", action="store_true")
+
+    args = parser.parse_args()
+    if args.command == "move":
+        move_user(args.user_id, args.to_shard, args.from_directory, args.drain_seconds,
+                  args.batch_size, args.keep_source)
+    else:
+        backfill(args.drain_seconds, args.batch_size, args.keep_source)
+
+
+if __name__ == "__main__":
+    main()
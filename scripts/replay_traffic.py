@@ -0,0 +1,298 @@
+# scripts/replay_traffic.py
+"""
+Replays captured traffic (TRAFFIC_CAPTURE_FILE) against a local instance and
+reports per-endpoint latency next to the captured latency.
+
+    GEMINI_STUB=true STRIPE_STUB=true uvicorn app:app    # + worker and relay
+    python scripts/replay_traffic.py capture.jsonl                 # real time
+    python scripts/replay_traffic.py capture.jsonl --speed 10      # 10x faster
+
+Each captured actor becomes a fresh local user, signed up and logged in before
+the clock starts; captured signups are replayed with throwaway numbers. Each
+captured chatroom becomes a fresh room of its user, created untimed on first
+use. Requests are sent at
+their captured offsets divided by --speed, whether or not earlier ones have
+returned. Actors that sent more messages in a day than Basic allows are
+upgraded to Pro in DATABASE_URL, so heavy senders are not cut off by 429s.
+Stripe webhooks are not replayed — they need Stripe-signed payloads.
+"""
+import argparse
+import json
+import os
+import random
+import statistics
+import sys
+import threading
+import time
+from collections import Counter, defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
+
+# Add project root to Python path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import httpx
+
+BASIC_DAILY_MESSAGES = 5
+SEND_ROUTE = "/chatroom/{chatroom_id}/message"
+SKIPPED_ROUTES = {"/subscribe/webhook"}
+PASSWORD = "replay-password"
+JSON_CONTENT_OVERHEAD = len('{"content":""}')
+
+
+def load(paths) -> list:
+    records = []
+    for path in paths:
+        with open(path) as f:
+            records.extend(json.loads(line) for line in f if line.strip())
+    records = [r for r in records if r.get("r") and r["r"] not in SKIPPED_ROUTES]
+    records.sort(key=lambda r: r["t"])
+    return records
+
+
+def heavy_senders(records) -> set:
+    """Actors with more accepted messages in one UTC day than Basic allows — they were Pro."""
+    sends = Counter(
+        (r["a"], r["t"] // 86_400_000) for r in records
+        if r["m"] == "POST" and r["r"] == SEND_ROUTE and r["a"] and 200 <= r["s"] < 300
+    )
+    return {actor for (actor, _), count in sends.items() if count > BASIC_DAILY_MESSAGES}
+
+
+def promote_to_pro(mobile: str) -> bool:
+    try:
+        from src.database.session import SessionLocal
+        from src.models import User
+        db = SessionLocal()
+        try:
+            db.query(User).filter(User.mobile_number == mobile).update({"subscription_tier": "Pro"})
+            db.commit()
+        finally:
+            db.close()
+        return True
+    except Exception as e:
+        print(f"⚠️ Could not upgrade a heavy sender to Pro ({e}); expect 429s for them")
+        return False
+
+
+class Actor:
+    def __init__(self, mobile: str, pro: bool):
+        self.mobile = mobile
+        self.pro = pro
+        self.headers: Optional[dict] = None
+        self.otp: Optional[str] = None
+        self.chatrooms = {}   # captured chatroom pseudonym -> local chatroom id
+        self.last_message = {}  # local chatroom id -> latest local message id
+        self.lock = threading.RLock()
+
+
+class Replayer:
+    def __init__(self, base_url: str, admin_key: Optional[str], heavy: set, concurrency: int, timeout: float):
+        limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+        self.client = httpx.Client(base_url=base_url, timeout=timeout, limits=limits)
+        self.admin_key = admin_key
+        self.heavy = heavy
+        self.actors = {}
+        self.results = defaultdict(list)  # "METHOD route" -> [(status, ms)]
+        self.issue_lag = []
+        self.skipped = Counter()
+        self.lock = threading.Lock()
+
+    # --- untimed setup ---
+    def actor(self, pseudonym: Optional[str]) -> Optional[Actor]:
+        if pseudonym is None:
+            return None
+        with self.lock:
+            if pseudonym not in self.actors:
+                mobile = f"+1999{random.randint(0, 10 ** 7 - 1):07d}"
+                self.actors[pseudonym] = Actor(mobile, pseudonym in self.heavy)
+            return self.actors[pseudonym]
+
+    def fresh_otp(self, actor: Actor) -> str:
+        return self.client.post("/auth/send-otp", json={"mobile_number": actor.mobile}).json()["otp"]
+
+    def login(self, actor: Actor) -> dict:
+        with actor.lock:
+            if actor.headers is None:
+                # Own connection: the signup response is not needed, and an error response may close it
+                httpx.post(self.client.base_url.join("/auth/signup"),
+                           json={"mobile_number": actor.mobile, "password": PASSWORD})
+                if actor.pro:
+                    promote_to_pro(actor.mobile)
+                token = self.client.post("/auth/verify-otp", json={
+                    "mobile_number": actor.mobile, "otp": self.fresh_otp(actor)
+                }).json()["access_token"]
+                actor.headers = {"Authorization": f"Bearer {token}"}
+            return actor.headers
+
+    def setup(self, records: list, concurrency: int) -> None:
+        pseudonyms = sorted({r["a"] for r in records if r["a"]})
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            list(pool.map(lambda pseudonym: self.login(self.actor(pseudonym)), pseudonyms))
+
+    def chatroom(self, actor: Actor, pseudonym: str) -> int:
+        with actor.lock:
+            if pseudonym not in actor.chatrooms:
+                created = self.client.post("/chatroom", json={"name": "replay"}, headers=self.login(actor))
+                actor.chatrooms[pseudonym] = created.json()["id"]
+            return actor.chatrooms[pseudonym]
+
+    # --- replay ---
+    def prepare(self, record: dict):
+        """(method, url, request kwargs) for a captured request, or None to skip it."""
+        route, actor = record["r"], self.actor(record["a"])
+        kwargs = {"params": record.get("q") or None, "headers": {}}
+
+        params = {}
+        for name, pseudonym in record["p"].items():
+            if actor is None:
+                return None
+            if name == "chatroom_id":
+                params[name] = self.chatroom(actor, pseudonym)
+            elif name == "message_id" and actor.last_message.get(params.get("chatroom_id")):
+                params[name] = actor.last_message[params["chatroom_id"]]
+            else:
+                return None
+        url = route.format(**params)
+
+        if route.startswith("/admin/"):
+            if not self.admin_key:
+                return None
+            kwargs["headers"]["X-Admin-Key"] = self.admin_key
+        elif route.startswith("/auth/") and route != "/auth/change-password":
+            if actor is None:
+                return None
+            if route == "/auth/signup":
+                kwargs["json"] = {"mobile_number": f"+1998{random.randint(0, 10 ** 7 - 1):07d}", "password": PASSWORD}
+            elif route == "/auth/verify-otp":
+                kwargs["json"] = {"mobile_number": actor.mobile, "otp": actor.otp or self.fresh_otp(actor)}
+                actor.otp = None
+            else:
+                kwargs["json"] = {"mobile_number": actor.mobile}
+        elif actor is not None:
+            kwargs["headers"].update(self.login(actor))
+
+        if route == SEND_ROUTE:
+            size = max(1, record["b"] - JSON_CONTENT_OVERHEAD)
+            kwargs["json"] = {"content": ("lorem ipsum " * (size // 12 + 1))[:size]}
+        elif route == "/chatroom" and record["m"] == "POST":
+            kwargs["json"] = {"name": "replay"}
+        elif route == "/auth/change-password":
+            kwargs["json"] = {"new_password": PASSWORD}
+        return record["m"], url, kwargs
+
+    def learn(self, record: dict, response: httpx.Response) -> None:
+        """Keeps the state later requests of the same actor depend on."""
+        actor, route = self.actor(record["a"]), record["r"]
+        if actor is None or response.status_code >= 300:
+            return
+        if route in ("/auth/send-otp", "/auth/forgot-password"):
+            actor.otp = response.json().get("otp")
+        elif route == "/auth/verify-otp":
+            actor.headers = {"Authorization": f"Bearer {response.json()['access_token']}"}
+        elif route == SEND_ROUTE:
+            chatroom_id = actor.chatrooms.get(record["p"]["chatroom_id"])
+            actor.last_message[chatroom_id] = response.json()["id"]
+        elif route == "/chatroom/{chatroom_id}" and record["m"] == "DELETE":
+            actor.chatrooms.pop(record["p"]["chatroom_id"], None)
+
+    def execute(self, record: dict, due: float, started: float) -> None:
+        endpoint = f"{record['m']} {record['r']}"
+        try:
+            prepared = self.prepare(record)
+        except Exception as e:
+            print(f"⚠️ Setup for {endpoint} failed: {e}")
+            prepared = None
+        if prepared is None:
+            with self.lock:
+                self.skipped[endpoint] += 1
+            return
+
+        method, url, kwargs = prepared
+        issued = time.perf_counter()
+        try:
+            if record["r"] == "/auth/signup":
+                # Own connection, as in signup() — an error response may close a pooled one
+                response = httpx.request(method, self.client.base_url.join(url), timeout=self.client.timeout, **kwargs)
+            else:
+                response = self.client.request(method, url, **kwargs)
+            status_code = response.status_code
+        except httpx.HTTPError:
+            response, status_code = None, 0
+        elapsed = (time.perf_counter() - issued) * 1000
+        if response is not None:
+            self.learn(record, response)
+
+        with self.lock:
+            self.results[endpoint].append((status_code, elapsed))
+            self.issue_lag.append(max(0.0, issued - started - due) * 1000)
+
+    def run(self, records: list, speed: float, concurrency: int) -> None:
+        first = records[0]["t"]
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            for record in records:
+                due = (record["t"] - first) / 1000 / speed if speed > 0 else 0.0
+                delay = started + due - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+                pool.submit(self.execute, record, due, started)
+        self.duration = time.perf_counter() - started
+
+
+def percentile(values: list, q: float) -> float:
+    return values[min(len(values) - 1, int(len(values) * q))]
+
+
+def report(replayer: Replayer, records: list) -> None:
+    captured = defaultdict(list)
+    for r in records:
+        captured[f"{r['m']} {r['r']}"].append(r["d"])
+
+    total = sum(len(v) for v in replayer.results.values())
+    print(f"\nReplayed {total} requests in {replayer.duration:.1f}s "
+          f"({len(replayer.actors)} actors, {sum(replayer.skipped.values())} skipped)")
+    print(f"{'endpoint':<44} {'n':>6} {'p50':>8} {'p90':>8} {'p99':>8} {'max':>8} {'5xx%':>6} {'cap p50':>8} {'cap p99':>8}")
+    for endpoint in sorted(replayer.results, key=lambda e: -len(replayer.results[e])):
+        results = replayer.results[endpoint]
+        ms = sorted(elapsed for _, elapsed in results)
+        errors = sum(1 for status_code, _ in results if status_code == 0 or status_code >= 500)
+        cap = sorted(captured[endpoint])
+        print(f"{endpoint:<44} {len(ms):>6} {statistics.median(ms):>8.1f} {percentile(ms, 0.9):>8.1f} "
+              f"{percentile(ms, 0.99):>8.1f} {ms[-1]:>8.1f} {100 * errors / len(ms):>6.1f} "
+              f"{statistics.median(cap):>8.1f} {percentile(cap, 0.99):>8.1f}")
+
+    statuses = Counter(status_code for results in replayer.results.values() for status_code, _ in results)
+    print(f"\nstatus codes: {dict(sorted(statuses.items()))}")
+    if replayer.issue_lag:
+        lag = sorted(replayer.issue_lag)
+        # Large values mean this client could not keep the schedule — raise --concurrency
+        print(f"send delay vs schedule: p50 {statistics.median(lag):.1f} ms, p99 {percentile(lag, 0.99):.1f} ms")
+    for endpoint, count in replayer.skipped.most_common():
+        print(f"skipped {count}x {endpoint}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay captured traffic against a local instance")
+    parser.add_argument("captures", nargs="+", help="TRAFFIC_CAPTURE_FILE output(s)")
+    parser.add_argument("--base-url", default="http://localhost:8000")
+    parser.add_argument("--speed", type=float, default=1.0, help="time compression; 0 = as fast as possible")
+    parser.add_argument("--concurrency", type=int, default=64, help="max requests in flight")
+    parser.add_argument("--admin-key", default=os.getenv("ADMIN_API_KEY"), help="to replay /admin requests")
+    parser.add_argument("--timeout", type=float, default=30)
+    args = parser.parse_args()
+
+    records = load(args.captures)
+    if not records:
+        sys.exit("No replayable requests in the capture")
+    span = (records[-1]["t"] - records[0]["t"]) / 1000
+    print(f"Loaded {len(records)} requests spanning {span:.0f}s; replaying at {args.speed or 'max'}x")
+
+    replayer = Replayer(args.base_url, args.admin_key, heavy_senders(records), args.concurrency, args.timeout)
+    replayer.setup(records, min(args.concurrency, 8))
+    replayer.run(records, args.speed, args.concurrency)
+    report(replayer, records)
+
+
+if __name__ == "__main__":
+    main()
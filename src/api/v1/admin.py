@@ -0,0 +1,61 @@
+# src/api/v1/admin.py
+import hmac
+from datetime import date, datetime
+from typing import Literal, Optional
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, status
+from sqlalchemy.orm import Session
+from src.core.config import settings
+from src.database.session import get_db
+from src.models import TierUsageRollup
+from src.utils.usage import get_period_usage, period_start
+
+router = APIRouter(prefix="/admin", tags=["admin"])
+
+
+def require_admin(x_admin_key: Optional[str] = Header(None)):
+    """Admin routes need X-Admin-Key to match ADMIN_API_KEY; unset key disables them."""
+    # Constant-time comparison, so response timing doesn't reveal the key
+    if not settings.ADMIN_API_KEY or not hmac.compare_digest(
+        (x_admin_key or "").encode(), settings.ADMIN_API_KEY.encode()
+    ):
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Admin access required")
+
+
+# --- GET /admin/usage ---
+@router.get("/usage", dependencies=[Depends(require_admin)])
+def get_usage(
+    period: Literal["day", "month"] = "day",
+    day: Optional[date] = Query(None, description="Any date inside the period (default: today, UTC)"),
+    user_id: Optional[int] = None,
+    db: Session = Depends(get_db)
+):
+    """
+    Usage for one day or month, read from the rollup tables.
+    With user_id: that user's totals. Without: totals per subscription tier,
+    one stored row per tier however many users were active.
+    """
+    day = day or datetime.utcnow().date()
+    if user_id is not None:
+        return {"period": period, "user_id": user_id, **get_period_usage(db, user_id, period, day)}
+
+    start = period_start(period, day)
+    rows = db.query(TierUsageRollup).filter(
+        TierUsageRollup.period == period,
+        TierUsageRollup.period_start == start,
+    ).order_by(TierUsageRollup.tier).all()
+
+    return {
+        "period": period,
+        "period_start": start.isoformat(),
+        "tiers": [
+            {
+                "tier": row.tier,
+                "active_users": row.active_users,
+                "messages": row.message_count,
+                "prompt_tokens": row.prompt_tokens,
+                "completion_tokens": row.completion_tokens,
+                "total_tokens": row.total_tokens,
+            }
+            for row in rows
+        ]
+    }
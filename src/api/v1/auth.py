@@ -4,6 +4,7 @@ from sqlalchemy.orm import Session
 from src.schemas.auth import UserCreate, OTPRequest, OTPVerify, Token, ForgotPasswordRequest, ChangePasswordRequest
 from src.models.user import User
 from src.database.session import get_db
+from src.database.sharding import shard_router
 from src.core.security import (
     generate_otp,
     store_otp,
@@ -35,6 +36,9 @@ def signup(user: UserCreate, db: Session = Depends(get_db)):
     db.add(new_user)
     db.commit()
     db.refresh(new_user)
+
+    # Give the user's shard a copy of the identity row for chatroom/message FKs
+    shard_router.mirror_user(new_user)
     return new_user
 
 @router.post("/send-otp")
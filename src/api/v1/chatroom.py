@@ -1,28 +1,60 @@
 # src/api/v1/chatroom.py
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
-from typing import List
+from fastapi import APIRouter, Depends, Header, HTTPException, Response, status
+from sqlalchemy.orm import Session, selectinload
+from starlette.concurrency import run_in_threadpool
+from typing import List, Optional, Tuple
+from concurrent.futures import Future
 from datetime import datetime
-from src.schemas.chatroom import ChatroomCreate, ChatroomResponse, MessageCreate, MessageResponse
-from src.models import Chatroom, Message, User
+import json
+import time
+from src.schemas.chatroom import ChatroomCreate, ChatroomResponse, MessageCreate, MessageResponse, SendMessageResponse
+from src.models import Chatroom, Message, User, record_chatroom_message
 from src.database.session import get_db
+from src.database.sharding import get_shard_db, get_shard_read_db
+from src.database.replicas import get_current_reader
 from src.core.security import get_current_user
 from src.utils.cache import get_cached_chatrooms, cache_chatrooms, invalidate_chatrooms_cache
-# Import the Celery task object, not a function named enqueue_gemini_task
-from src.celery_app import process_gemini_message  # Correct import for Celery task
+from src.utils.usage import get_period_usage, monthly_token_limit
+from src.utils.compression import make_preview
+from src.utils.admission import check_admission
+from src.utils.outbox import enqueue_task, GEMINI_TASK
+from src.utils.execution import execution_backend
+from src.utils.idempotency import Idempotency, REPLAYED_HEADER, request_fingerprint
+from src.utils.prompt import forget_chatroom
+from src.core.config import settings
 import logging
 
 router = APIRouter(prefix="/chatroom", tags=["chatroom"])
 logger = logging.getLogger(__name__)
 
+
+def message_response(message: Message, preview: bool = False) -> MessageResponse:
+    """Full body (decompressed if needed), or a preview that never touches message_bodies."""
+    if preview:
+        content = make_preview(message.content)
+        truncated = message.is_compressed or content != message.content
+    else:
+        content = message.full_content
+        truncated = False
+    return MessageResponse(
+        id=message.id,
+        content=content,
+        is_from_user=message.is_from_user,
+        created_at=message.created_at,
+        truncated=truncated,
+        # Rows from before the column have their full text inline
+        content_length=message.content_length if message.content_length is not None else len(message.content)
+    )
+
 # --- GET /chatroom — CACHED LIST OF CHATROOMS ---
 @router.get("", response_model=List[ChatroomResponse])
 def list_chatrooms(
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    shard_db: Session = Depends(get_shard_read_db),
+    current_user: User = Depends(get_current_reader)
 ):
     """
-    Lists all chatrooms for the authenticated user.
+    Lists all chatrooms for the authenticated user, most recently active first,
+    with message count and last-message preview for the dashboard.
     
     📌 CACHING JUSTIFICATION:
     - This endpoint is called frequently when loading the dashboard.
@@ -38,8 +70,10 @@ def list_chatrooms(
         # If issues persist, use the serialization helper from previous steps
         return [ChatroomResponse(**c) for c in cached]
 
-    # Fallback to DB
-    chatrooms = db.query(Chatroom).filter(Chatroom.user_id == current_user.id).all()
+    # Fallback to DB — one query on (user_id, last_message_at), read backwards
+    chatrooms = shard_db.query(Chatroom).filter(
+        Chatroom.user_id == current_user.id
+    ).order_by(Chatroom.last_message_at.desc()).all()
 
     # Cache result
     chatroom_schemas = [ChatroomResponse.from_orm(c) for c in chatrooms]
@@ -53,39 +87,67 @@ def list_chatrooms(
 
 # --- POST /chatroom — CREATE NEW CHATROOM ---
 @router.post("", response_model=ChatroomResponse, status_code=status.HTTP_201_CREATED)
-def create_chatroom(
+async def create_chatroom(
     chatroom: ChatroomCreate,
+    response: Response,
+    idempotency_key: Optional[str] = Header(None, max_length=255),
     db: Session = Depends(get_db),
+    shard_db: Session = Depends(get_shard_db),
     current_user: User = Depends(get_current_user)
 ):
     """
     Creates a new chatroom for the authenticated user.
     Invalidates the chatroom cache on creation.
+    A retry with the same `Idempotency-Key` returns the room created first.
     """
+    idempotency = Idempotency(idempotency_key, current_user.id, "create_chatroom",
+                              request_fingerprint(chatroom.name))
+    stored = await idempotency.start(on_wait=lambda: _end_reads(db, shard_db))
+    if stored is not None:
+        response.status_code, body = stored
+        response.headers[REPLAYED_HEADER] = "true"
+        return body
+
+    try:
+        result = await run_in_threadpool(_create_chatroom, chatroom, shard_db, current_user)
+    except Exception:
+        await run_in_threadpool(idempotency.release)
+        raise
+    await run_in_threadpool(idempotency.complete, status.HTTP_201_CREATED, result.model_dump(mode="json"))
+    return result
+
+
+def _create_chatroom(chatroom: ChatroomCreate, shard_db: Session, current_user: User) -> ChatroomResponse:
     new_chat = Chatroom(name=chatroom.name, user_id=current_user.id)
-    db.add(new_chat)
-    db.commit()
-    db.refresh(new_chat)
+    shard_db.add(new_chat)
+    shard_db.commit()
+    shard_db.refresh(new_chat)
 
     # Invalidate cache to ensure fresh data on next GET /chatroom
     invalidate_chatrooms_cache(str(current_user.id))
     logger.info(f"✅ Created chatroom {new_chat.id} and invalidated cache for user {current_user.id}")
+    return ChatroomResponse.model_validate(new_chat)
+
 
-    return new_chat
+def _end_reads(db: Session, shard_db: Session) -> None:
+    # Nothing is written before the idempotency claim — give the connections back while a duplicate waits
+    db.rollback()
+    if shard_db is not db:
+        shard_db.rollback()
 
 
 # --- GET /chatroom/{chatroom_id} — GET SINGLE CHATROOM DETAILS ---
 @router.get("/{chatroom_id}", response_model=ChatroomResponse)
 def get_chatroom(
     chatroom_id: int,
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    shard_db: Session = Depends(get_shard_read_db),
+    current_user: User = Depends(get_current_reader)
 ):
     """
     Retrieves detailed information about a specific chatroom.
     Ensures ownership before returning.
     """
-    chatroom = db.query(Chatroom).filter(
+    chatroom = shard_db.query(Chatroom).filter(
         Chatroom.id == chatroom_id,
         Chatroom.user_id == current_user.id
     ).first()
@@ -100,14 +162,14 @@ def get_chatroom(
 @router.delete("/{chatroom_id}", status_code=status.HTTP_204_NO_CONTENT)
 def delete_chatroom(
     chatroom_id: int,
-    db: Session = Depends(get_db),
+    shard_db: Session = Depends(get_shard_db),
     current_user: User = Depends(get_current_user)
 ):
     """
     Deletes a specific chatroom owned by the user.
     Invalidates the chatroom cache on deletion.
     """
-    chatroom = db.query(Chatroom).filter(
+    chatroom = shard_db.query(Chatroom).filter(
         Chatroom.id == chatroom_id,
         Chatroom.user_id == current_user.id
     ).first()
@@ -115,33 +177,96 @@ def delete_chatroom(
     if not chatroom:
         raise HTTPException(status_code=404, detail="Chatroom not found")
 
-    db.delete(chatroom)
-    db.commit()
+    shard_db.delete(chatroom)
+    shard_db.commit()
 
     # Invalidate cache to reflect deletion
     invalidate_chatrooms_cache(str(current_user.id))
+    # Embeddings of the conversation go too (worker hosts drop theirs when a task finds the room gone)
+    forget_chatroom(current_user.id, chatroom_id)
     logger.info(f"✅ Deleted chatroom {chatroom_id} and invalidated cache for user {current_user.id}")
 
 
 # --- POST /chatroom/{chatroom_id}/message — SEND MESSAGE TO GEMINI (ASYNC) ---
-@router.post("/{chatroom_id}/message", response_model=MessageResponse, status_code=status.HTTP_202_ACCEPTED)
-def send_message(
+@router.post("/{chatroom_id}/message", response_model=SendMessageResponse, status_code=status.HTTP_202_ACCEPTED)
+async def send_message(
     chatroom_id: int,
     message_data: MessageCreate,
+    response: Response,
+    idempotency_key: Optional[str] = Header(None, max_length=255),
     db: Session = Depends(get_db),
+    shard_db: Session = Depends(get_shard_db),
     current_user: User = Depends(get_current_user)
 ):
     """
     Sends a user message and triggers an async Gemini API call via Celery + Redis.
+    The task is written to the outbox with the message and published by the relay.
     Returns 202 Accepted immediately while processing occurs in background.
+
+    ⚡ EXECUTION_BACKEND=inline runs the task in the API process instead; when the
+    reply is ready within INLINE_REPLY_DEADLINE_SECONDS it is returned as `reply`
+    with 200 OK, otherwise the response is the usual 202. The route is async so a
+    request waiting for its reply holds no threadpool thread or DB connection;
+    the database work runs on the threadpool.
     
     🔒 RATE LIMITING:
     - Basic tier: 5 messages/day
     - Pro tier: Unlimited
     - Daily counter resets at UTC midnight
+
+    🚦 LOAD SHEDDING:
+    - 503 + Retry-After when queue depth or worker lag passes the tier's threshold
+    - Tasks that wait longer than TASK_MAX_AGE_SECONDS are dropped and refunded
+
+    ♻️ IDEMPOTENCY: send an `Idempotency-Key` header to make retries safe; see
+    src/utils/idempotency.py.
     """
+    # ♻️ IDEMPOTENCY: a retry with the same Idempotency-Key gets the original response —
+    # no second message, quota charge or Gemini call; concurrent duplicates wait for the first
+    idempotency = Idempotency(idempotency_key, current_user.id, "send_message",
+                              request_fingerprint(chatroom_id, message_data.content))
+    stored = await idempotency.start(on_wait=lambda: _end_reads(db, shard_db))
+    if stored is not None:
+        response.status_code, body = stored
+        response.headers[REPLAYED_HEADER] = "true"
+        return body
+
+    try:
+        result = await _send_message(chatroom_id, message_data, response, db, shard_db, current_user)
+    except Exception:
+        await run_in_threadpool(idempotency.release)
+        raise
+    await run_in_threadpool(idempotency.complete, response.status_code or status.HTTP_202_ACCEPTED,
+                            result.model_dump(mode="json"))
+    return result
+
+
+async def _send_message(chatroom_id: int, message_data: MessageCreate, response: Response,
+                        db: Session, shard_db: Session, current_user: User) -> SendMessageResponse:
+    accepted, future = await run_in_threadpool(
+        _accept_message, chatroom_id, message_data, db, shard_db, current_user
+    )
+    if future is None:
+        # Return 202 Accepted immediately — async processing in progress
+        return accepted
+
+    # The task has its own sessions; give our connections back while it runs
+    db.close()
+    shard_db.close()
+    result = await execution_backend.wait_for_reply(future, settings.INLINE_REPLY_DEADLINE_SECONDS)
+    if not result or not result.get("message_id"):
+        return accepted
+
+    reply = await run_in_threadpool(_load_reply, shard_db, result["message_id"])
+    response.status_code = status.HTTP_200_OK
+    return SendMessageResponse(**accepted.model_dump(exclude={"reply"}), reply=reply)
+
+
+def _accept_message(chatroom_id: int, message_data: MessageCreate, db: Session, shard_db: Session,
+                    current_user: User) -> Tuple[SendMessageResponse, Optional[Future]]:
+    """Checks limits, stores the message and its outbox row; the future is set for inline runs."""
     # Validate chatroom ownership
-    chatroom = db.query(Chatroom).filter(
+    chatroom = shard_db.query(Chatroom).filter(
         Chatroom.id == chatroom_id,
         Chatroom.user_id == current_user.id
     ).first()
@@ -149,6 +274,24 @@ def send_message(
     if not chatroom:
         raise HTTPException(status_code=404, detail="Chatroom not found")
 
+    # 🚦 ADMISSION CONTROL: reject early when the Gemini pipeline is backed up,
+    # before any quota is reserved (Basic is shed before Pro)
+    retry_after = check_admission(current_user.subscription_tier)
+    if retry_after is not None:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="The assistant is overloaded right now. Please retry shortly.",
+            headers={"Retry-After": str(retry_after)}
+        )
+
+    # 🔒 TOKEN QUOTA: monthly Gemini tokens from the usage rollup (O(1) lookup)
+    token_limit = monthly_token_limit(current_user.subscription_tier)
+    if token_limit and get_period_usage(db, current_user.id, "month")["total_tokens"] >= token_limit:
+        raise HTTPException(
+            status_code=429,
+            detail=f"Monthly token limit reached ({token_limit} tokens for {current_user.subscription_tier} tier)."
+        )
+
     # 🔒 RATE LIMITING: Basic tier = 5 messages/day
     now = datetime.utcnow().date()
     if current_user.subscription_tier == "Basic":
@@ -171,41 +314,69 @@ def send_message(
 
     # Save user message to DB
     user_message = Message(
-        content=message_data.content,
         is_from_user=True,
         chatroom_id=chatroom_id,
         user_id=current_user.id
     )
-    db.add(user_message)
-    db.commit()
-    db.refresh(user_message)
-
-    # ✅ TRIGGER CELERY TASK ASYNCHRONOUSLY — ASYNC GEMINI CALL
-    # Call the .delay() method on the Celery task object
-    process_gemini_message.delay( # <-- Correct way to call Celery task
-        message_content=message_data.content,
+    user_message.set_content(message_data.content)
+    shard_db.add(user_message)
+    shard_db.flush()
+    record_chatroom_message(shard_db, chatroom_id, message_data.content)
+
+    # ✅ QUEUE THE GEMINI TASK IN THE SAME TRANSACTION (TRANSACTIONAL OUTBOX)
+    # No broker I/O here — the outbox relay publishes it to Celery once committed
+    event = enqueue_task(
+        shard_db,
+        GEMINI_TASK,
+        user_id=current_user.id,
         chatroom_id=chatroom_id,
-        user_id=current_user.id
+        message_id=user_message.id,
+        enqueued_at=time.time()
     )
+    run_inline = execution_backend.claim(event)
+    try:
+        if run_inline:
+            shard_db.flush()
+            event_id, task_kwargs = event.id, json.loads(event.payload)
+        shard_db.commit()
+    except Exception:
+        if run_inline:
+            execution_backend.release_claim()
+        raise
+    # The message is stored — hand the task over before anything else can fail,
+    # or the claim would never be released
+    future = execution_backend.dispatch(event_id, task_kwargs) if run_inline else None
+    shard_db.refresh(user_message)
+
+    # Summary (count, last message) changed — drop the cached dashboard list
+    invalidate_chatrooms_cache(str(current_user.id))
 
-    logger.info(f"✅ Enqueued Gemini task (Celery) for message {user_message.id} from user {current_user.id}")
+    logger.info(f"✅ Queued Gemini task ({'inline' if run_inline else 'outbox'}) for message {user_message.id} from user {current_user.id}")
+    accepted = SendMessageResponse(**message_response(user_message).model_dump())
+    return accepted, future
 
-    # Return 202 Accepted immediately — async processing in progress
-    return user_message
+
+def _load_reply(shard_db: Session, message_id: int) -> MessageResponse:
+    return message_response(shard_db.query(Message).filter(Message.id == message_id).one())
 
 
 # --- GET /chatroom/{chatroom_id}/messages — FETCH ALL MESSAGES IN CHATROOM ---
 @router.get("/{chatroom_id}/messages", response_model=List[MessageResponse])
 def get_messages(
     chatroom_id: int,
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    preview: bool = False,
+    shard_db: Session = Depends(get_shard_read_db),
+    current_user: User = Depends(get_current_reader)
 ):
     """
     Retrieves all messages in a specific chatroom, ordered chronologically.
     Includes both user messages and AI responses.
+
+    With ?preview=true each message is cut to MESSAGE_PREVIEW_CHARS and
+    compressed bodies are not loaded at all; truncated messages are fetched
+    individually from GET /chatroom/{chatroom_id}/messages/{message_id}.
     """
-    chatroom = db.query(Chatroom).filter(
+    chatroom = shard_db.query(Chatroom).filter(
         Chatroom.id == chatroom_id,
         Chatroom.user_id == current_user.id
     ).first()
@@ -213,8 +384,34 @@ def get_messages(
     if not chatroom:
         raise HTTPException(status_code=404, detail="Chatroom not found")
 
-    messages = db.query(Message).filter(
+    query = shard_db.query(Message).filter(
         Message.chatroom_id == chatroom_id
-    ).order_by(Message.created_at).all()
+    ).order_by(Message.created_at)
+    if not preview:
+        # One extra query for all compressed bodies instead of one per message
+        query = query.options(selectinload(Message.body))
+
+    return [message_response(m, preview) for m in query.all()]
+
+
+# --- GET /chatroom/{chatroom_id}/messages/{message_id} — FULL MESSAGE BODY ---
+@router.get("/{chatroom_id}/messages/{message_id}", response_model=MessageResponse)
+def get_message(
+    chatroom_id: int,
+    message_id: int,
+    shard_db: Session = Depends(get_shard_read_db),
+    current_user: User = Depends(get_current_reader)
+):
+    """
+    Retrieves one message with its full (decompressed) content.
+    """
+    message = shard_db.query(Message).join(Chatroom).filter(
+        Message.id == message_id,
+        Message.chatroom_id == chatroom_id,
+        Chatroom.user_id == current_user.id
+    ).first()
+
+    if not message:
+        raise HTTPException(status_code=404, detail="Message not found")
 
-    return messages
+    return message_response(message)
@@ -6,6 +6,8 @@ from src.core.config import settings
 from src.models import User # Only import User
 from src.database.session import get_db
 from src.core.security import get_current_user
+from src.database.replicas import get_read_db, get_current_reader
+from src.utils.usage import get_period_usage, monthly_token_limit
 import logging
 
 router = APIRouter(prefix="/subscribe", tags=["subscription"])
@@ -24,6 +26,9 @@ def create_pro_subscription(
     Creates a Stripe Checkout Session for a Pro subscription.
     Returns the session URL for redirection.
     """
+    if settings.STRIPE_STUB:
+        return {"url": f"{settings.FRONTEND_URL}/success?session_id=cs_stub_{current_user.id}"}
+
     try:
         # TODO: Replace 'price_...' with your actual Stripe Price ID for the Pro plan.
         checkout_session = stripe.checkout.Session.create(
@@ -141,16 +146,24 @@ async def stripe_webhook(
 # --- GET /subscription/status ---
 @router.get("/status")
 def get_subscription_status(
-    current_user: User = Depends(get_current_user)
+    db: Session = Depends(get_read_db),
+    current_user: User = Depends(get_current_reader)
 ):
     """
     Returns the current subscription tier and usage information for the user.
+    Token usage comes from the daily/monthly rollups — no message scan.
     """
     daily_limit = 5 if current_user.subscription_tier == "Basic" else "Unlimited"
+    token_limit = monthly_token_limit(current_user.subscription_tier)
     
     return {
         "tier": current_user.subscription_tier,
         "daily_limit": daily_limit,
         "messages_used_today": current_user.daily_message_count,
-        "last_reset_date": current_user.last_message_date.isoformat() if current_user.last_message_date else None
+        "last_reset_date": current_user.last_message_date.isoformat() if current_user.last_message_date else None,
+        "monthly_token_limit": token_limit or "Unlimited",
+        "usage": {
+            "today": get_period_usage(db, current_user.id, "day"),
+            "this_month": get_period_usage(db, current_user.id, "month"),
+        }
     }
@@ -1,9 +1,12 @@
 # src/celery_app.py
+from typing import Optional
 from celery import Celery
-import google.generativeai as genai
 from src.core.config import settings
-from src.database.session import SessionLocal
-from src.models import Message, User, Chatroom
+from src.database.sharding import ShardLockedError
+from src.utils.profiling import install_task_profiler
+from src.utils.outbox import GEMINI_TASK
+from src.utils.admission import record_worker_lag
+from src.utils.gemini import answer_message
 
 # Configure Celery with Redis
 celery_app = Celery(
@@ -12,39 +15,21 @@ celery_app = Celery(
     backend=f'redis://:{settings.REDIS_PASSWORD}@{settings.REDIS_HOST}:{settings.REDIS_PORT}/{settings.REDIS_DB}'
 )
 
-# Configure Gemini API
-genai.configure(api_key=settings.GEMINI_API_KEY)
-
-@celery_app.task
-def process_gemini_message(message_content: str, chatroom_id: int, user_id: int):
-    """Process Gemini API call as a Celery task"""
-    db = SessionLocal()
+# Opt-in profiling of a sampled fraction of tasks (PROFILE_SAMPLE_RATE)
+install_task_profiler()
+
+# Retried while the rebalance tool has the user's shard locked for cutover.
+# Name is pinned because the outbox relay publishes it by name.
+@celery_app.task(name=GEMINI_TASK, autoretry_for=(ShardLockedError,), retry_backoff=True, max_retries=5)
+def process_gemini_message(chatroom_id: int, user_id: int, message_id: Optional[int] = None,
+                           message_content: Optional[str] = None, enqueued_at: Optional[float] = None):
+    """
+    Process Gemini API call as a Celery task (EXECUTION_BACKEND=celery, and the
+    fallback for inline runs that did not finish).
+    """
+    lag = record_worker_lag(enqueued_at) if enqueued_at else 0.0
     try:
-        user = db.query(User).filter(User.id == user_id).first()
-        chatroom = db.query(Chatroom).filter(Chatroom.id == chatroom_id).first()
-
-        if not user or not chatroom:
-            print(f"❌ User or chatroom not found: user={user_id}, chatroom={chatroom_id}")
-            return
-
-        model = genai.GenerativeModel('gemini-2.5-flash')
-        response = model.generate_content(message_content)
-
-        ai_message = Message(
-            content=response.text,
-            is_from_user=False,
-            chatroom_id=chatroom_id,
-            user_id=user_id
-        )
-        db.add(ai_message)
-        db.commit()
-        db.refresh(ai_message)
-
-        print(f"✅ AI response saved for chatroom {chatroom_id}: {response.text[:50]}...")
-        return {"success": True, "message_id": ai_message.id}
-
+        return answer_message(chatroom_id, user_id, message_id, message_content, enqueued_at, lag)
     except Exception as e:
         print(f"❌ Error in Celery task: {e}")
         raise
-    finally:
-        db.close()
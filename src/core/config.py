@@ -1,10 +1,14 @@
 # src/core/config.py
 import os
-from typing import Optional
+from typing import List, Optional
 from dotenv import load_dotenv
 
 load_dotenv()  # ✅ MUST BE FIRST
 
+# Relative paths below resolve against the project root, not the working
+# directory — the API and the worker (started from src/) must share them
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
 class Settings:
     PROJECT_NAME: str = "Gemini Backend Clone - Kuvaka Tech"
     SECRET_KEY: str = os.getenv("SECRET_KEY", "your_super_secret_key_here_123!")
@@ -13,6 +17,28 @@ class Settings:
 
     DATABASE_URL: str = os.getenv("DATABASE_URL")
 
+    # Read replicas of DATABASE_URL — comma-separated, empty means reads use the primary
+    REPLICA_DATABASE_URLS: List[str] = [
+        url.strip() for url in os.getenv("REPLICA_DATABASE_URLS", "").split(",") if url.strip()
+    ]
+    REPLICA_MAX_LAG_SECONDS: float = float(os.getenv("REPLICA_MAX_LAG_SECONDS", 5))
+    REPLICA_CHECK_INTERVAL_SECONDS: float = float(os.getenv("REPLICA_CHECK_INTERVAL_SECONDS", 5))
+    REPLICA_RETRY_SECONDS: float = float(os.getenv("REPLICA_RETRY_SECONDS", 30))
+    # PostgreSQL only — bounds how long a connection to an unreachable replica can hang
+    REPLICA_CONNECT_TIMEOUT_SECONDS: int = int(os.getenv("REPLICA_CONNECT_TIMEOUT_SECONDS", 3))
+    # Reads are pinned to the primary for this long after a user's own write.
+    # Keep it above REPLICA_MAX_LAG_SECONDS so stale reads never refill the cache.
+    READ_YOUR_WRITES_SECONDS: int = int(os.getenv("READ_YOUR_WRITES_SECONDS", 10))
+
+    # Sharding — comma-separated shard URLs for chatrooms/messages, each optionally
+    # followed by its replicas: "primary|replica1|replica2,primary2".
+    # Empty means everything lives in DATABASE_URL (the directory DB).
+    SHARD_DATABASE_URLS: List[str] = [
+        url.strip() for url in os.getenv("SHARD_DATABASE_URLS", "").split(",") if url.strip()
+    ]
+    # Connections reserved for handing out global ids when sharded, apart from request sessions
+    ID_ALLOCATOR_POOL_SIZE: int = int(os.getenv("ID_ALLOCATOR_POOL_SIZE", 5))
+
     # Redis
     REDIS_HOST: str = os.getenv("REDIS_HOST", "localhost")
     REDIS_PORT: int = int(os.getenv("REDIS_PORT", 6379))
@@ -20,12 +46,87 @@ class Settings:
     REDIS_DB: int = int(os.getenv("REDIS_DB", 0))
     REDIS_SSL: bool = os.getenv("REDIS_SSL", "false").lower() == "true"
 
+    # Profiling — off unless a sample rate or debug token is set.
+    # Requests sending "X-Debug-Profile: <PROFILE_DEBUG_TOKEN>" are always profiled.
+    PROFILE_SAMPLE_RATE: float = float(os.getenv("PROFILE_SAMPLE_RATE", 0))
+    PROFILE_DEBUG_TOKEN: str = os.getenv("PROFILE_DEBUG_TOKEN", "")
+    PROFILE_DIR: str = os.path.join(PROJECT_ROOT, os.getenv("PROFILE_DIR", "profiles"))
+    PROFILE_INTERVAL_MS: float = float(os.getenv("PROFILE_INTERVAL_MS", 5))
+    QUERY_COUNT_BUDGET: int = int(os.getenv("QUERY_COUNT_BUDGET", 25))
+    N_PLUS_ONE_THRESHOLD: int = int(os.getenv("N_PLUS_ONE_THRESHOLD", 5))
+
+    # Usage — monthly Gemini token quotas per tier (0 = unlimited)
+    BASIC_MONTHLY_TOKEN_LIMIT: int = int(os.getenv("BASIC_MONTHLY_TOKEN_LIMIT", 0))
+    PRO_MONTHLY_TOKEN_LIMIT: int = int(os.getenv("PRO_MONTHLY_TOKEN_LIMIT", 0))
+    # Required in X-Admin-Key for /admin routes; empty disables them
+    ADMIN_API_KEY: str = os.getenv("ADMIN_API_KEY", "")
+
+    # Message storage — bodies at/above the threshold (bytes) move to a compressed side table
+    MESSAGE_COMPRESSION_THRESHOLD: int = int(os.getenv("MESSAGE_COMPRESSION_THRESHOLD", 2048))
+    MESSAGE_COMPRESSION_LEVEL: int = int(os.getenv("MESSAGE_COMPRESSION_LEVEL", 6))
+    MESSAGE_PREVIEW_CHARS: int = int(os.getenv("MESSAGE_PREVIEW_CHARS", 280))
+
+    # Outbox relay — publishes committed tasks to Celery in batches
+    OUTBOX_POLL_INTERVAL_SECONDS: float = float(os.getenv("OUTBOX_POLL_INTERVAL_SECONDS", 0.2))
+    OUTBOX_BATCH_SIZE: int = int(os.getenv("OUTBOX_BATCH_SIZE", 100))
+    OUTBOX_RETENTION_HOURS: int = int(os.getenv("OUTBOX_RETENTION_HOURS", 24))
+
+    # Admission control for send_message — shed Basic first, then Pro.
+    # Queue depth is the broker's Celery list; lag is enqueue -> task start, in seconds.
+    CELERY_QUEUE_NAME: str = os.getenv("CELERY_QUEUE_NAME", "celery")
+    ADMISSION_MAX_QUEUE_DEPTH_BASIC: int = int(os.getenv("ADMISSION_MAX_QUEUE_DEPTH_BASIC", 200))
+    ADMISSION_MAX_QUEUE_DEPTH_PRO: int = int(os.getenv("ADMISSION_MAX_QUEUE_DEPTH_PRO", 1000))
+    ADMISSION_MAX_LAG_SECONDS_BASIC: float = float(os.getenv("ADMISSION_MAX_LAG_SECONDS_BASIC", 30))
+    ADMISSION_MAX_LAG_SECONDS_PRO: float = float(os.getenv("ADMISSION_MAX_LAG_SECONDS_PRO", 120))
+    ADMISSION_RETRY_AFTER_SECONDS: int = int(os.getenv("ADMISSION_RETRY_AFTER_SECONDS", 30))
+    ADMISSION_CACHE_SECONDS: float = float(os.getenv("ADMISSION_CACHE_SECONDS", 1))
+    # Tasks older than this when a worker picks them up are dropped and the quota refunded
+    TASK_MAX_AGE_SECONDS: float = float(os.getenv("TASK_MAX_AGE_SECONDS", 300))
+
+    # Prompt context — recent turns plus the most relevant older ones from the vector index.
+    # EMBEDDER is "hashing" (offline, deterministic) or "package.module:Class".
+    EMBEDDER: str = os.getenv("EMBEDDER", "hashing")
+    EMBEDDING_DIM: int = int(os.getenv("EMBEDDING_DIM", 256))
+    VECTOR_INDEX_DIR: str = os.path.join(PROJECT_ROOT, os.getenv("VECTOR_INDEX_DIR", "vector_index"))
+    PROMPT_HISTORY_MESSAGES: int = int(os.getenv("PROMPT_HISTORY_MESSAGES", 10))
+    PROMPT_RETRIEVED_MESSAGES: int = int(os.getenv("PROMPT_RETRIEVED_MESSAGES", 5))
+    PROMPT_SNIPPET_CHARS: int = int(os.getenv("PROMPT_SNIPPET_CHARS", 1000))
+    RETRIEVAL_MIN_SCORE: float = float(os.getenv("RETRIEVAL_MIN_SCORE", 0.1))
+
+    # Where send_message runs Gemini: "celery" (worker, published by the outbox relay) or
+    # "inline" (asyncio task in the API process). Inline runs claim their outbox row for
+    # INLINE_CLAIM_SECONDS; if the process dies first, the relay hands the task to Celery.
+    EXECUTION_BACKEND: str = os.getenv("EXECUTION_BACKEND", "celery")
+    INLINE_CONCURRENCY: int = int(os.getenv("INLINE_CONCURRENCY", 8))
+    INLINE_MAX_PENDING: int = int(os.getenv("INLINE_MAX_PENDING", 32))
+    INLINE_REPLY_DEADLINE_SECONDS: float = float(os.getenv("INLINE_REPLY_DEADLINE_SECONDS", 8))
+    INLINE_CLAIM_SECONDS: int = int(os.getenv("INLINE_CLAIM_SECONDS", 120))
+    INLINE_DRAIN_SECONDS: float = float(os.getenv("INLINE_DRAIN_SECONDS", 20))
+
+    # Idempotency-Key on POST /chatroom and POST /chatroom/{id}/message: responses are
+    # kept for IDEMPOTENCY_TTL_SECONDS; a duplicate arriving mid-request waits up to
+    # IDEMPOTENCY_WAIT_SECONDS (above INLINE_REPLY_DEADLINE_SECONDS) before a 409.
+    IDEMPOTENCY_TTL_SECONDS: int = int(os.getenv("IDEMPOTENCY_TTL_SECONDS", 86400))
+    IDEMPOTENCY_LOCK_SECONDS: int = int(os.getenv("IDEMPOTENCY_LOCK_SECONDS", 60))
+    IDEMPOTENCY_WAIT_SECONDS: float = float(os.getenv("IDEMPOTENCY_WAIT_SECONDS", 10))
+
+    # Opt-in capture of anonymized request shapes and timings for scripts/replay_traffic.py.
+    # Pseudonyms use TRAFFIC_CAPTURE_KEY, or a key derived from SECRET_KEY, so all workers agree.
+    TRAFFIC_CAPTURE_FILE: str = os.getenv("TRAFFIC_CAPTURE_FILE", "")
+    TRAFFIC_CAPTURE_SAMPLE_RATE: float = float(os.getenv("TRAFFIC_CAPTURE_SAMPLE_RATE", 1.0))
+    TRAFFIC_CAPTURE_KEY: str = os.getenv("TRAFFIC_CAPTURE_KEY", "")
+
     # Gemini
     GEMINI_API_KEY: str = os.getenv("GEMINI_API_KEY", "")
+    # Canned replies after a fixed delay instead of calling Gemini (local benchmarks)
+    GEMINI_STUB: bool = os.getenv("GEMINI_STUB", "false").lower() == "true"
+    GEMINI_STUB_LATENCY_MS: int = int(os.getenv("GEMINI_STUB_LATENCY_MS", 500))
 
     # Stripe
     STRIPE_SECRET_KEY: str = os.getenv("STRIPE_SECRET_KEY", "")
     STRIPE_WEBHOOK_SECRET: str = os.getenv("STRIPE_WEBHOOK_SECRET", "")
+    # Fake checkout sessions instead of calling Stripe (local load replay)
+    STRIPE_STUB: bool = os.getenv("STRIPE_STUB", "false").lower() == "true"
     FRONTEND_URL: str = os.getenv("FRONTEND_URL", "http://localhost:3000")
 
 settings = Settings()
\ No newline at end of file
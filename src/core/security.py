@@ -83,16 +83,14 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -
     to_encode.update({"exp": expire})
     return jwt.encode(to_encode, settings.SECRET_KEY, algorithm=settings.ALGORITHM)
 
-def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)) -> User:
-    """
-    Dependency to get the current authenticated user from the JWT token.
-    Raises an HTTPException if the token is invalid or the user doesn't exist.
-    """
-    credentials_exception = HTTPException(
-        status_code=status.HTTP_401_UNAUTHORIZED,
-        detail="Could not validate credentials",
-        headers={"WWW-Authenticate": "Bearer"},
-    )
+credentials_exception = HTTPException(
+    status_code=status.HTTP_401_UNAUTHORIZED,
+    detail="Could not validate credentials",
+    headers={"WWW-Authenticate": "Bearer"},
+)
+
+def decode_subject(token: str) -> str:
+    """Returns the mobile_number stored as 'sub' in a valid JWT, else raises 401."""
     try:
         # Decode the JWT token
         payload = jwt.decode(token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM])
@@ -102,10 +100,20 @@ def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(
             raise credentials_exception
     except JWTError:
         raise credentials_exception
+    return mobile_number
+
+def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)) -> User:
+    """
+    Dependency to get the current authenticated user from the JWT token.
+    Raises an HTTPException if the token is invalid or the user doesn't exist.
+    """
+    mobile_number = decode_subject(token)
 
     # Fetch the user from the database
     user = db.query(User).filter(User.mobile_number == mobile_number).first()
     if user is None:
         raise credentials_exception
 
+    # Commits on this session pin the user's reads to the primary (read-your-writes)
+    db.info["subject"] = mobile_number
     return user
@@ -0,0 +1,93 @@
+# src/database/ids.py
+from typing import List
+from sqlalchemy import Column, Integer, String, Table, event, select, text
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import DBAPIError, IntegrityError
+from src.database.base import Base
+
+# Next free id per table when the directory DB has no sequences (SQLite)
+id_counters = Table(
+    "id_counters", Base.metadata,
+    Column("name", String, primary_key=True),
+    Column("next_id", Integer, nullable=False),
+)
+
+
+class IdAllocator:
+    """
+    Hands out primary keys for one table that are unique across the directory DB
+    and every shard, so a user's rows keep their ids when the rebalance tool copies
+    them to another shard. The shards' own sequences are never used.
+
+    Ids come from one counter in the directory DB — a sequence on PostgreSQL, a row
+    in id_counters elsewhere — so they still increase in the order rows are
+    created, which prompt history and the vector index catch-up rely on. The
+    counter starts above the highest id stored anywhere. Every inserted row costs
+    one round trip to the directory DB, on an engine separate from request sessions.
+    """
+
+    def __init__(self, table_name: str, directory: Engine, engines: List[Engine]):
+        self.table_name = table_name
+        self.directory = directory
+        self.engines = engines
+        self.sequence = f"{table_name}_global_id_seq"
+        self._sequence_ready = False
+
+    def __call__(self) -> int:
+        if self.directory.dialect.name == "postgresql":
+            return self._next_from_sequence()
+        return self._next_from_table()
+
+    def _next_from_sequence(self) -> int:
+        if not self._sequence_ready:
+            try:
+                with self.directory.begin() as conn:
+                    conn.execute(text(
+                        f"CREATE SEQUENCE IF NOT EXISTS {self.sequence} START WITH {self._highest_id() + 1}"
+                    ))
+            except DBAPIError:
+                pass  # created by another process at the same moment
+            self._sequence_ready = True
+        with self.directory.begin() as conn:
+            return conn.execute(text(f"SELECT nextval('{self.sequence}')")).scalar_one()
+
+    def _next_from_table(self) -> int:
+        row = id_counters.c.name == self.table_name
+        while True:
+            bump = id_counters.update().where(row).values(next_id=id_counters.c.next_id + 1)
+            with self.directory.begin() as conn:
+                if self.directory.dialect.update_returning:
+                    # One statement per id
+                    bumped = conn.execute(bump.returning(id_counters.c.next_id)).scalar()
+                    if bumped is not None:
+                        return bumped - 1
+                # The UPDATE locks the row, so the read below sees our own bump
+                elif conn.execute(bump).rowcount:
+                    return conn.execute(select(id_counters.c.next_id).where(row)).scalar_one() - 1
+
+            start = self._highest_id() + 1
+            try:
+                with self.directory.begin() as conn:
+                    conn.execute(id_counters.insert().values(name=self.table_name, next_id=start + 1))
+                return start
+            except IntegrityError:
+                continue  # another process created the row first — bump it instead
+
+    def _highest_id(self) -> int:
+        highest = 0
+        for engine in self.engines:
+            with engine.connect() as conn:
+                highest = max(highest, conn.execute(text(f"SELECT MAX(id) FROM {self.table_name}")).scalar() or 0)
+        return highest
+
+
+def use_global_ids(models, directory: Engine, engines: List[Engine]) -> None:
+    """Assigns ids from an IdAllocator to new rows of each model (ORM inserts without an id)."""
+    for model in models:
+        allocate = IdAllocator(model.__tablename__, directory, engines)
+
+        def assign_id(mapper, connection, target, allocate=allocate):
+            if target.id is None:
+                target.id = allocate()
+
+        event.listen(model, "before_insert", assign_id)
@@ -0,0 +1,171 @@
+# src/database/replicas.py
+import itertools
+import logging
+import threading
+import time
+from typing import List, Optional
+from fastapi import Depends
+from redis.exceptions import RedisError
+from sqlalchemy import create_engine, event, text
+from sqlalchemy.engine import make_url
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.orm import Session, sessionmaker
+from src.core.config import settings
+from src.core.security import oauth2_scheme, decode_subject, credentials_exception
+from src.database.session import SessionLocal
+from src.models.user import User
+from src.utils.cache import mark_recent_write, has_recent_write
+
+logger = logging.getLogger(__name__)
+
+# Seconds behind the primary; 0 when the replica has replayed everything it received
+POSTGRES_LAG_SQL = text("""
+    SELECT CASE
+        WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+        ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0)
+    END
+""")
+
+
+class Replica:
+    """
+    A replica engine plus its last known health. Health checks run on a background
+    thread, at most one at a time, so requests never wait on an unreachable
+    replica. Until its first check passes, a replica gets no reads.
+    """
+
+    def __init__(self, url: str):
+        connect_args = {}
+        if make_url(url).get_backend_name() == "postgresql":
+            connect_args["connect_timeout"] = settings.REPLICA_CONNECT_TIMEOUT_SECONDS
+        self.engine = create_engine(url, pool_pre_ping=True, connect_args=connect_args)
+        self.sessionmaker = sessionmaker(autocommit=False, autoflush=False, bind=self.engine)
+        self.lag = float("inf")
+        self.checked_at = float("-inf")
+        self.down_until = 0.0
+        self._checking = False
+        self._lock = threading.Lock()
+
+        # Connection errors during normal queries take the replica out of rotation too
+        event.listen(self.engine, "handle_error", self._on_error)
+
+    def _on_error(self, context) -> None:
+        if context.is_disconnect:
+            self.mark_down()
+
+    def mark_down(self) -> None:
+        # Unusable until a health check after REPLICA_RETRY_SECONDS passes again
+        self.lag = float("inf")
+        self.down_until = time.monotonic() + settings.REPLICA_RETRY_SECONDS
+        logger.warning(f"⚠️ Replica {self.engine.url!r} marked down for {settings.REPLICA_RETRY_SECONDS}s")
+
+    def check(self) -> None:
+        try:
+            with self.engine.connect() as conn:
+                if self.engine.dialect.name == "postgresql":
+                    self.lag = float(conn.execute(POSTGRES_LAG_SQL).scalar() or 0)
+                else:
+                    conn.execute(text("SELECT 1"))
+                    self.lag = 0.0
+        except SQLAlchemyError as e:
+            logger.warning(f"⚠️ Replica health check failed: {e}")
+            self.mark_down()
+        finally:
+            with self._lock:
+                self._checking = False
+
+    def _check_in_background(self) -> None:
+        with self._lock:
+            if self._checking:
+                return
+            self._checking = True
+            self.checked_at = time.monotonic()
+        threading.Thread(target=self.check, name="replica-health", daemon=True).start()
+
+    def is_usable(self) -> bool:
+        """Last known health; schedules a check when it is due, without waiting for it."""
+        now = time.monotonic()
+        if now < self.down_until:
+            return False
+        if now - self.checked_at > settings.REPLICA_CHECK_INTERVAL_SECONDS:
+            self._check_in_background()
+        return self.lag <= settings.REPLICA_MAX_LAG_SECONDS
+
+
+class ReplicaPool:
+    """
+    Round-robin over the replicas of one primary, skipping any that are down or
+    lagging more than REPLICA_MAX_LAG_SECONDS. Falls back to the primary.
+    """
+
+    # True once any pool has replicas — lets the write path skip Redis otherwise
+    any_configured = False
+
+    def __init__(self, urls: List[str], primary: sessionmaker):
+        self.primary = primary
+        self.replicas = [Replica(url) for url in urls]
+        self._turn = itertools.count()
+        if self.replicas:
+            ReplicaPool.any_configured = True
+
+    def pick(self) -> Optional[Replica]:
+        if not self.replicas:
+            return None
+        start = next(self._turn)
+        for i in range(len(self.replicas)):
+            replica = self.replicas[(start + i) % len(self.replicas)]
+            if replica.is_usable():
+                return replica
+        return None
+
+    def session(self, pin_to_primary: bool = False) -> Session:
+        replica = None if pin_to_primary else self.pick()
+        return replica.sessionmaker() if replica else self.primary()
+
+
+directory_replicas = ReplicaPool(settings.REPLICA_DATABASE_URLS, SessionLocal)
+
+
+# --- READ-YOUR-WRITES ---
+# Any session that flushed a write for a known user marks them after commit.
+@event.listens_for(Session, "after_flush")
+def _note_write(session, flush_context):
+    session.info["wrote"] = True
+
+@event.listens_for(Session, "after_rollback")
+def _forget_write(session):
+    session.info.pop("wrote", None)
+
+@event.listens_for(Session, "after_commit")
+def _mark_recent_write(session):
+    if session.info.pop("wrote", False) and ReplicaPool.any_configured:
+        subject = session.info.get("subject")
+        if subject:
+            try:
+                mark_recent_write(subject)
+            except RedisError as e:
+                # The write is committed — failing the request now would invite a duplicate retry
+                logger.warning(f"⚠️ Could not mark recent write for read-your-writes: {e}")
+
+
+# Dependency for read-only routes — replica session unless the caller wrote recently
+def get_read_db(token: str = Depends(oauth2_scheme)):
+    subject = decode_subject(token)
+    try:
+        pinned = ReplicaPool.any_configured and has_recent_write(subject)
+    except RedisError:
+        pinned = True  # can't tell whether they wrote recently — read from the primary
+    db = directory_replicas.session(pin_to_primary=pinned)
+    db.info["subject"] = subject
+    db.info["pinned"] = pinned
+    try:
+        yield db
+    finally:
+        db.close()
+
+def get_current_reader(db: Session = Depends(get_read_db)) -> User:
+    """Like get_current_user, but loads the user through the read session."""
+    user = db.query(User).filter(User.mobile_number == db.info["subject"]).first()
+    if user is None:
+        raise credentials_exception
+    return user
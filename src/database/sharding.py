@@ -0,0 +1,170 @@
+# src/database/sharding.py
+from typing import Callable, List, Tuple
+from fastapi import Depends, HTTPException, status
+from sqlalchemy import Table, create_engine, select
+from sqlalchemy.orm import Session, sessionmaker
+from sqlalchemy.pool import NullPool
+from src.core.config import settings
+from src.core.security import get_current_user
+from src.database.session import get_db
+from src.database.ids import use_global_ids
+from src.database.replicas import ReplicaPool, get_read_db, get_current_reader
+from src.models import User, Chatroom, Message, MessageBody, OutboxEvent
+
+
+class ShardLockedError(RuntimeError):
+    """Raised when a user's data is being moved between shards."""
+
+
+class ShardRouter:
+    """
+    Maps a user to one of the configured shard databases.
+
+    The directory DB (DATABASE_URL) keeps the users table. Chatrooms and messages
+    live on the user's shard: User.shard when the rebalance tool has placed the
+    user explicitly, otherwise user_id % number of shards.
+
+    Each URL may be followed by "|"-separated replica URLs for that shard.
+    """
+
+    def __init__(self, urls: List[str]):
+        groups = [url.split("|") for url in urls]
+        self.engines = [create_engine(group[0]) for group in groups]
+        self.sessionmakers = [
+            sessionmaker(autocommit=False, autoflush=False, bind=engine)
+            for engine in self.engines
+        ]
+        self.replicas = [
+            ReplicaPool(group[1:], primary)
+            for group, primary in zip(groups, self.sessionmakers)
+        ]
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.engines)
+
+    def default_shard(self, user_id: int) -> int:
+        return user_id % len(self.engines)
+
+    def shard_for(self, user: User) -> int:
+        if user.shard_locked:
+            raise ShardLockedError(f"User {user.id} is being moved between shards")
+        return user.shard if user.shard is not None else self.default_shard(user.id)
+
+    def session_for(self, user: User, default: Session) -> Session:
+        """Session on the user's shard, or `default` when sharding is disabled."""
+        if not self.enabled:
+            return default
+        return self.sessionmakers[self.shard_for(user)]()
+
+    def read_session_for(self, user: User, default: Session, pin_to_primary: bool = False) -> Session:
+        """Read session on a replica of the user's shard, or `default` when sharding is disabled."""
+        if not self.enabled:
+            return default
+        return self.replicas[self.shard_for(user)].session(pin_to_primary)
+
+    def confirm_placement(self, db: Session, user: User, shard_db: Session) -> None:
+        """
+        Re-reads the user's placement right before a long-running task commits to
+        `shard_db`, raising ShardLockedError if a cutover started or finished since
+        the task resolved its shard. The user row stays locked until `db` commits,
+        so the rebalance tool's lock waits for this task's writes to land.
+        """
+        if not self.enabled:
+            return
+        current = db.query(User.id, User.shard, User.shard_locked).filter(
+            User.id == user.id
+        ).with_for_update().one()
+        if self.engines[self.shard_for(current)] is not shard_db.get_bind():
+            raise ShardLockedError(f"User {user.id} was moved to another shard mid-task")
+
+    def mirror_user(self, user: User) -> None:
+        """
+        Copies the user's identity row onto their shard so foreign keys from
+        chatrooms/messages resolve there. The directory row stays authoritative.
+        """
+        if not self.enabled:
+            return
+        shard_db = self.sessionmakers[self.shard_for(user)]()
+        try:
+            shard_db.merge(User(id=user.id, mobile_number=user.mobile_number))
+            shard_db.commit()
+        finally:
+            shard_db.close()
+
+
+shard_router = ShardRouter(settings.SHARD_DATABASE_URLS)
+
+# Ids must not collide when a user's rows are copied to another shard.
+# message_bodies is keyed by message id and needs no allocator of its own.
+if shard_router.enabled:
+    # Ids are allocated mid-request while the request's own sessions hold connections,
+    # so the allocator never draws on their pools: a small pool of its own for the
+    # counter, and unpooled connections for the one-off MAX(id) reads on the shards
+    id_engine = create_engine(settings.DATABASE_URL, pool_size=settings.ID_ALLOCATOR_POOL_SIZE, max_overflow=0)
+    use_global_ids(
+        [Chatroom, Message, OutboxEvent],
+        id_engine,
+        [id_engine, *(create_engine(engine.url, poolclass=NullPool) for engine in shard_router.engines)]
+    )
+
+
+# Tables whose rows belong to exactly one user, in insert order (parents first).
+# Each entry is (table, mutable, filter) — mutable tables get re-synced at cutover
+# because existing rows may change; the others are append-only.
+USER_SCOPED_TABLES: List[Tuple[Table, bool, Callable[[int], object]]] = [
+    (Chatroom.__table__, True, lambda user_id: Chatroom.user_id == user_id),
+    (Message.__table__, False, lambda user_id: Message.user_id == user_id),
+    (MessageBody.__table__, False, lambda user_id: MessageBody.message_id.in_(
+        select(Message.id).where(Message.user_id == user_id)
+    )),
+    (OutboxEvent.__table__, True, lambda user_id: OutboxEvent.user_id == user_id),
+]
+
+
+def _shard_session(open_session):
+    """Opens a shard session, turning a cutover lock into 503 + Retry-After."""
+    try:
+        return open_session()
+    except ShardLockedError:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Your chats are being moved. Please retry in a few seconds.",
+            headers={"Retry-After": "5"},
+        )
+
+
+# Dependency for chatroom routes — yields a session on the caller's shard.
+# Without shards configured this is the request's directory session itself.
+def get_shard_db(
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    shard_db = _shard_session(lambda: shard_router.session_for(current_user, db))
+    if shard_db is db:
+        yield db
+        return
+
+    shard_db.info["subject"] = db.info.get("subject")
+    try:
+        yield shard_db
+    finally:
+        shard_db.close()
+
+
+# Read-only counterpart — a replica of the caller's shard unless they wrote recently.
+def get_shard_read_db(
+    current_user: User = Depends(get_current_reader),
+    db: Session = Depends(get_read_db)
+):
+    shard_db = _shard_session(
+        lambda: shard_router.read_session_for(current_user, db, db.info.get("pinned", False))
+    )
+    if shard_db is db:
+        yield db
+        return
+
+    try:
+        yield shard_db
+    finally:
+        shard_db.close()
@@ -1,3 +1,5 @@
 # src/models/__init__.py
 from .user import User
-from .chatroom import Chatroom, Message
\ No newline at end of file
+from .chatroom import Chatroom, Message, MessageBody, record_chatroom_message
+from .usage import UsageRollup, TierUsageRollup
+from .outbox import OutboxEvent
\ No newline at end of file
@@ -1,7 +1,8 @@
 # src/models/chatroom.py
-from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, func ,Boolean 
+from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, func ,Boolean, LargeBinary, Index, update
 from sqlalchemy.orm import relationship
 from src.database.base import Base
+from src.utils.compression import CODEC, compress_text, decompress_text, should_compress, make_preview
 
 class Chatroom(Base):
     __tablename__ = "chatrooms"
@@ -11,10 +12,40 @@ class Chatroom(Base):
     user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
     created_at = Column(DateTime, default=func.now())
 
+    # Dashboard summary — maintained on every message insert, never recomputed.
+    # last_message_at starts at creation, so a new room sorts as recent activity.
+    message_count = Column(Integer, default=0, nullable=False)
+    last_message_at = Column(DateTime, default=func.now(), nullable=True)
+    last_message_preview = Column(String, nullable=True)
+
+    __table_args__ = (
+        Index("ix_chatrooms_user_last_message", "user_id", "last_message_at"),
+    )
+
     owner = relationship("User", back_populates="chatrooms")  # Must match User.chatrooms
     messages = relationship("Message", back_populates="chatroom", cascade="all, delete-orphan")
 
 
+SUMMARY_PREVIEW_CHARS = 120
+
+
+def record_chatroom_message(db, chatroom_id: int, text: str) -> None:
+    """
+    Bumps the chatroom's summary for a new message with one atomic UPDATE,
+    in the caller's transaction.
+    """
+    db.execute(
+        update(Chatroom)
+        .where(Chatroom.id == chatroom_id)
+        .values(
+            message_count=Chatroom.message_count + 1,
+            last_message_at=func.now(),
+            last_message_preview=make_preview(text, SUMMARY_PREVIEW_CHARS)
+        )
+        .execution_options(synchronize_session=False)
+    )
+
+
 class Message(Base):
     __tablename__ = "messages"
 
@@ -25,5 +56,44 @@ class Message(Base):
     user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
     created_at = Column(DateTime, default=func.now())
 
+    # The user message an AI reply answers — unique, so duplicate deliveries can't both reply
+    reply_to_id = Column(Integer, ForeignKey("messages.id", ondelete="SET NULL"), nullable=True, index=True, unique=True)
+
+    # Gemini usage metadata — set on AI replies only
+    prompt_tokens = Column(Integer, nullable=True)
+    completion_tokens = Column(Integer, nullable=True)
+
+    # Large bodies live compressed in message_bodies; `content` then holds a preview
+    is_compressed = Column(Boolean, default=False, nullable=False)
+    content_length = Column(Integer, nullable=True)
+
     chatroom = relationship("Chatroom", back_populates="messages")
-    user = relationship("User", back_populates="messages")
\ No newline at end of file
+    user = relationship("User", back_populates="messages")
+    # Loaded only when full_content is read (or eagerly via selectinload)
+    body = relationship("MessageBody", uselist=False, lazy="select", cascade="all, delete-orphan")
+
+    def set_content(self, text: str) -> None:
+        """Stores text inline, or compressed in a MessageBody once it passes the threshold."""
+        self.content_length = len(text)
+        if should_compress(text):
+            self.content = make_preview(text)
+            self.is_compressed = True
+            self.body = MessageBody(codec=CODEC, data=compress_text(text))
+        else:
+            self.content = text
+            self.is_compressed = False
+            self.body = None
+
+    @property
+    def full_content(self) -> str:
+        if self.is_compressed and self.body is not None:
+            return decompress_text(self.body.codec, self.body.data)
+        return self.content
+
+
+class MessageBody(Base):
+    __tablename__ = "message_bodies"
+
+    message_id = Column(Integer, ForeignKey("messages.id", ondelete="CASCADE"), primary_key=True)
+    codec = Column(String, nullable=False)
+    data = Column(LargeBinary, nullable=False)
\ No newline at end of file
@@ -0,0 +1,26 @@
+# src/models/outbox.py
+from datetime import datetime
+from sqlalchemy import Column, Integer, String, Text, DateTime, ForeignKey, Index, func
+from src.database.base import Base
+
+class OutboxEvent(Base):
+    """
+    A Celery task waiting to be published. Written in the same transaction as the
+    data it refers to; the relay publishes pending rows and marks them sent.
+    """
+    __tablename__ = "outbox_events"
+
+    id = Column(Integer, primary_key=True, index=True)
+    task_name = Column(String, nullable=False)
+    payload = Column(Text, nullable=False)  # JSON task kwargs
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
+    status = Column(String, default="pending", nullable=False)  # "pending" or "sent"
+    attempts = Column(Integer, default=0, nullable=False)
+    # UTC from Python, like the relay's comparison — the DB's now() follows its TimeZone
+    available_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+    created_at = Column(DateTime, default=func.now())
+    sent_at = Column(DateTime, nullable=True)
+
+    __table_args__ = (
+        Index("ix_outbox_events_status_available", "status", "available_at"),
+    )
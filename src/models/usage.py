@@ -0,0 +1,48 @@
+# src/models/usage.py
+from sqlalchemy import Column, Integer, String, Date, DateTime, ForeignKey, UniqueConstraint, func
+from src.database.base import Base
+
+class UsageRollup(Base):
+    """
+    Per-user usage for one day or month, kept up to date by the Celery worker.
+    A user who changes tier mid-period gets one row per tier.
+    """
+    __tablename__ = "usage_rollups"
+
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
+    tier = Column(String, nullable=False)
+    period = Column(String, nullable=False)  # "day" or "month"
+    period_start = Column(Date, nullable=False)
+    message_count = Column(Integer, default=0, nullable=False)
+    prompt_tokens = Column(Integer, default=0, nullable=False)
+    completion_tokens = Column(Integer, default=0, nullable=False)
+    total_tokens = Column(Integer, default=0, nullable=False)
+    updated_at = Column(DateTime, default=func.now(), onupdate=func.now())
+
+    __table_args__ = (
+        UniqueConstraint("user_id", "period", "period_start", "tier", name="uq_usage_rollup"),
+    )
+
+
+class TierUsageRollup(Base):
+    """
+    Usage of all users on one tier for one day or month, updated alongside the
+    per-user rows so the admin overview reads one row per tier.
+    """
+    __tablename__ = "tier_usage_rollups"
+
+    id = Column(Integer, primary_key=True, index=True)
+    tier = Column(String, nullable=False)
+    period = Column(String, nullable=False)  # "day" or "month"
+    period_start = Column(Date, nullable=False)
+    active_users = Column(Integer, default=0, nullable=False)
+    message_count = Column(Integer, default=0, nullable=False)
+    prompt_tokens = Column(Integer, default=0, nullable=False)
+    completion_tokens = Column(Integer, default=0, nullable=False)
+    total_tokens = Column(Integer, default=0, nullable=False)
+    updated_at = Column(DateTime, default=func.now(), onupdate=func.now())
+
+    __table_args__ = (
+        UniqueConstraint("period", "period_start", "tier", name="uq_tier_usage_rollup"),
+    )
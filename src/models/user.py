@@ -15,6 +15,11 @@ class User(Base):
     last_message_date = Column(DateTime, default=func.now())
     created_at = Column(DateTime, default=func.now())
 
+    # Sharding — NULL shard means the default placement (user_id % shard count).
+    # shard_locked is set by the rebalance tool during cutover.
+    shard = Column(Integer, nullable=True)
+    shard_locked = Column(Boolean, default=False)
+
     # 👇 This must be here — and match the back_populates in Chatroom
     chatrooms = relationship("Chatroom", back_populates="owner", cascade="all, delete-orphan")
     messages = relationship("Message", back_populates="user", cascade="all, delete-orphan")
\ No newline at end of file
@@ -0,0 +1,119 @@
+# src/outbox_relay.py
+"""
+Outbox relay — publishes committed outbox rows to the Celery broker in batches.
+
+    python -m src.outbox_relay
+
+Rows are marked sent only after the broker accepted them, so a crash between
+publish and commit re-publishes the batch: delivery is at-least-once and the
+tasks skip work that is already done. Several relays can run side by side on
+PostgreSQL (rows are claimed with SKIP LOCKED).
+"""
+import json
+import logging
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+from src.celery_app import celery_app
+from src.core.config import settings
+from src.database.session import SessionLocal
+from src.database.sharding import shard_router
+from src.models import OutboxEvent
+from src.utils.admission import record_outbox_watermark
+
+logger = logging.getLogger(__name__)
+
+MAX_BACKOFF_SECONDS = 60
+
+
+def relay_batch(db: Session, batch_size: int = None) -> int:
+    """Publishes up to one batch of due outbox rows. Returns how many were sent."""
+    now = datetime.utcnow()
+    events = db.query(OutboxEvent).filter(
+        OutboxEvent.status == "pending",
+        OutboxEvent.available_at <= now
+    ).order_by(OutboxEvent.id).limit(batch_size or settings.OUTBOX_BATCH_SIZE) \
+        .with_for_update(skip_locked=True).all()
+
+    if not events:
+        db.rollback()
+        return 0
+
+    sent = 0
+    # One broker connection for the whole batch
+    with celery_app.producer_or_acquire() as producer:
+        for event in events:
+            try:
+                celery_app.send_task(event.task_name, kwargs=json.loads(event.payload), producer=producer)
+                event.status = "sent"
+                event.sent_at = now
+                sent += 1
+            except Exception as e:
+                event.attempts += 1
+                event.available_at = now + timedelta(seconds=min(2 ** event.attempts, MAX_BACKOFF_SECONDS))
+                logger.error(f"❌ Failed to publish outbox event {event.id} (attempt {event.attempts}): {e}")
+    db.commit()
+    return sent
+
+
+def oldest_pending(db: Session) -> Optional[float]:
+    """Epoch seconds of the earliest pending row, None when nothing is waiting."""
+    oldest = db.query(func.min(OutboxEvent.available_at)).filter(OutboxEvent.status == "pending").scalar()
+    db.rollback()
+    return oldest.replace(tzinfo=timezone.utc).timestamp() if oldest else None
+
+
+def purge_sent(db: Session) -> None:
+    """Drops sent rows older than OUTBOX_RETENTION_HOURS."""
+    cutoff = datetime.utcnow() - timedelta(hours=settings.OUTBOX_RETENTION_HOURS)
+    db.query(OutboxEvent).filter(
+        OutboxEvent.status == "sent",
+        OutboxEvent.sent_at < cutoff
+    ).delete(synchronize_session=False)
+    db.commit()
+
+
+def run_relay() -> None:
+    # The outbox lives next to the messages: on every shard, or the directory DB
+    factories = shard_router.sessionmakers if shard_router.enabled else [SessionLocal]
+    last_purge = 0.0
+    logger.info(f"📮 Outbox relay started for {len(factories)} database(s)")
+
+    while True:
+        busy = False
+        purge_due = time.monotonic() - last_purge > 3600
+        # Everything committed before this pass started is published, unless a row is still pending
+        published_through, healthy = time.time(), True
+        for factory in factories:
+            db = factory()
+            try:
+                sent = relay_batch(db)
+                if sent:
+                    logger.info(f"📤 Published {sent} outbox event(s)")
+                # A full batch means there may be more waiting — skip the sleep
+                busy = busy or sent >= settings.OUTBOX_BATCH_SIZE
+                oldest = oldest_pending(db)
+                if oldest is not None:
+                    published_through = min(published_through, oldest)
+                if purge_due:
+                    purge_sent(db)
+            except Exception as e:
+                db.rollback()
+                healthy = False
+                logger.error(f"❌ Outbox relay error: {e}")
+            finally:
+                db.close()
+        # A failing database holds the watermark back, so admission sees the backlog age
+        if healthy:
+            record_outbox_watermark(published_through)
+        if purge_due:
+            last_purge = time.monotonic()
+        if not busy:
+            time.sleep(settings.OUTBOX_POLL_INTERVAL_SECONDS)
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    run_relay()
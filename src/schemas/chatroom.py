@@ -10,6 +10,9 @@ class ChatroomResponse(BaseModel):
     id: int
     name: str
     created_at: datetime
+    message_count: int = 0
+    last_message_at: Optional[datetime] = None
+    last_message_preview: Optional[str] = None
 
     class Config:
         from_attributes = True
@@ -22,10 +25,18 @@ class MessageResponse(BaseModel):
     content: str
     is_from_user: bool
     created_at: datetime
+    # True when `content` is a preview; fetch GET /chatroom/{id}/messages/{message_id} for the rest
+    truncated: bool = False
+    # Characters in the full message, so a client can tell how much a preview leaves out
+    content_length: Optional[int] = None
 
     class Config:
         from_attributes = True
 
+class SendMessageResponse(MessageResponse):
+    # The assistant's answer when it was ready before the response (EXECUTION_BACKEND=inline)
+    reply: Optional[MessageResponse] = None
+
 class UserResponse(BaseModel):
     id: int
     mobile_number: str
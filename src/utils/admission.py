@@ -0,0 +1,100 @@
+# src/utils/admission.py
+import logging
+import math
+import threading
+import time
+from datetime import datetime
+from typing import Optional, Tuple
+from redis.exceptions import RedisError
+from src.core.config import settings
+from src.models.user import User
+from src.utils.cache import redis_client
+
+logger = logging.getLogger(__name__)
+
+WORKER_LAG_KEY = "admission:worker_lag"
+# A lag reading older than this is ignored — queue depth covers stalled workers
+WORKER_LAG_TTL = 60
+# Epoch seconds the outbox relay has published everything up to; it stops moving when the
+# relay stalls, so its age is how long committed tasks have been waiting to reach the broker
+OUTBOX_WATERMARK_KEY = "admission:outbox_watermark"
+# A relay that is gone for good stops holding admission back after this long
+OUTBOX_WATERMARK_TTL = 3600
+
+_snapshot: Tuple[float, int, float] = (float("-inf"), 0, 0.0)
+_snapshot_lock = threading.Lock()
+
+
+def _load_snapshot() -> Tuple[int, float]:
+    """
+    (queue depth, lag) from Redis, refreshed at most every ADMISSION_CACHE_SECONDS.
+    The lag is the worker's or the outbox's, whichever is behind further.
+    """
+    global _snapshot
+    checked_at, depth, lag = _snapshot
+    if time.monotonic() - checked_at < settings.ADMISSION_CACHE_SECONDS:
+        return depth, lag
+
+    with _snapshot_lock:
+        checked_at, depth, lag = _snapshot
+        if time.monotonic() - checked_at < settings.ADMISSION_CACHE_SECONDS:
+            return depth, lag
+        try:
+            pipe = redis_client.pipeline(transaction=False)
+            pipe.llen(settings.CELERY_QUEUE_NAME)
+            pipe.get(WORKER_LAG_KEY)
+            pipe.get(OUTBOX_WATERMARK_KEY)
+            depth, lag, watermark = pipe.execute()
+            depth, lag = int(depth or 0), float(lag or 0)
+            if watermark is not None:
+                lag = max(lag, time.time() - float(watermark))
+        except RedisError as e:
+            # Fail open — the broker being unreachable is not a reason to reject chats
+            logger.warning(f"⚠️ Admission snapshot unavailable: {e}")
+            depth, lag = 0, 0.0
+        _snapshot = (time.monotonic(), depth, lag)
+        return depth, lag
+
+
+def check_admission(tier: str) -> Optional[int]:
+    """
+    None if a new message from this tier may be queued, otherwise the
+    Retry-After seconds to send with a 503. Basic's thresholds are lower,
+    so Basic traffic is shed before Pro.
+    """
+    depth, lag = _load_snapshot()
+    if tier == "Pro":
+        max_depth, max_lag = settings.ADMISSION_MAX_QUEUE_DEPTH_PRO, settings.ADMISSION_MAX_LAG_SECONDS_PRO
+    else:
+        max_depth, max_lag = settings.ADMISSION_MAX_QUEUE_DEPTH_BASIC, settings.ADMISSION_MAX_LAG_SECONDS_BASIC
+
+    if depth < max_depth and lag < max_lag:
+        return None
+    logger.warning(f"⚠️ Shedding {tier} message: queue depth {depth}/{max_depth}, lag {lag:.1f}s/{max_lag}s")
+    return max(settings.ADMISSION_RETRY_AFTER_SECONDS, math.ceil(lag - max_lag))
+
+
+def record_worker_lag(enqueued_at: float) -> float:
+    """Called by the worker as a task starts; returns the task's queueing delay."""
+    lag = max(0.0, time.time() - enqueued_at)
+    try:
+        redis_client.setex(WORKER_LAG_KEY, WORKER_LAG_TTL, f"{lag:.3f}")
+    except RedisError as e:
+        logger.warning(f"⚠️ Could not record worker lag: {e}")
+    return lag
+
+
+def record_outbox_watermark(published_through: float) -> None:
+    """Called by the outbox relay after each pass over every database."""
+    try:
+        redis_client.setex(OUTBOX_WATERMARK_KEY, OUTBOX_WATERMARK_TTL, f"{published_through:.3f}")
+    except RedisError as e:
+        logger.warning(f"⚠️ Could not record outbox watermark: {e}")
+
+
+def refund_daily_quota(user: User, enqueued_at: float) -> None:
+    """Gives back the Basic daily message a dropped task had reserved (same UTC day only)."""
+    sent_on = datetime.utcfromtimestamp(enqueued_at).date()
+    if (user.subscription_tier == "Basic" and user.daily_message_count
+            and user.last_message_date and user.last_message_date.date() == sent_on):
+        user.daily_message_count -= 1
@@ -1,11 +1,15 @@
 # src/utils/cache.py
 import redis
 import json
+import logging
 from datetime import datetime 
 from typing import Optional, List, Dict
+from redis.exceptions import RedisError
 from src.core.config import settings
 import ssl
 
+logger = logging.getLogger(__name__)
+
 # ✅ Create a custom SSL context for compatibility
 ssl_context = ssl.create_default_context()
 # Force TLS 1.2 or higher (required by Redis Cloud)
@@ -49,4 +53,17 @@ def get_cached_chatrooms(user_id: str) -> Optional[List[Dict]]:
 def invalidate_chatrooms_cache(user_id: str) -> None:
     """Delete cache when chatroom is created/deleted"""
     key = f"chatrooms:user:{user_id}"
-    redis_client.delete(key)
\ No newline at end of file
+    try:
+        redis_client.delete(key)
+    except RedisError as e:
+        # Called after a commit — failing now would invite a duplicate retry; the TTL bounds staleness
+        logger.warning(f"⚠️ Could not invalidate chatroom cache for user {user_id}: {e}")
+
+# --- READ-YOUR-WRITES MARKERS ---
+def mark_recent_write(subject: str) -> None:
+    """Pin the user's reads to the primary for READ_YOUR_WRITES_SECONDS"""
+    redis_client.setex(f"recent_write:{subject}", settings.READ_YOUR_WRITES_SECONDS, 1)
+
+def has_recent_write(subject: str) -> bool:
+    """True while the user's latest write may not have reached the replicas"""
+    return bool(redis_client.exists(f"recent_write:{subject}"))
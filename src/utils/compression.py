@@ -0,0 +1,26 @@
+# src/utils/compression.py
+import zlib
+from src.core.config import settings
+
+# zlib ships with Python; the codec is stored per row so another can be added later
+CODEC = "zlib"
+
+
+def compress_text(text: str) -> bytes:
+    return zlib.compress(text.encode("utf-8"), settings.MESSAGE_COMPRESSION_LEVEL)
+
+
+def decompress_text(codec: str, data: bytes) -> str:
+    if codec != CODEC:
+        raise ValueError(f"Unknown message body codec: {codec}")
+    return zlib.decompress(data).decode("utf-8")
+
+
+def should_compress(text: str) -> bool:
+    return len(text.encode("utf-8")) >= settings.MESSAGE_COMPRESSION_THRESHOLD
+
+
+def make_preview(text: str, limit: int = None) -> str:
+    """First `limit` characters (default MESSAGE_PREVIEW_CHARS), with an ellipsis if cut."""
+    limit = limit or settings.MESSAGE_PREVIEW_CHARS
+    return text if len(text) <= limit else text[:limit].rstrip() + "…"
@@ -0,0 +1,65 @@
+# src/utils/embeddings.py
+import hashlib
+import importlib
+import math
+import re
+from abc import ABC, abstractmethod
+from functools import lru_cache
+from typing import List
+import numpy as np
+from src.core.config import settings
+
+_TOKEN = re.compile(r"\w+", re.UNICODE)
+
+
+class Embedder(ABC):
+    """Turns texts into L2-normalized float32 vectors of a fixed dimension."""
+
+    dim: int
+
+    @abstractmethod
+    def embed(self, texts: List[str]) -> np.ndarray:
+        ...
+
+
+class HashingEmbedder(Embedder):
+    """
+    Deterministic, offline embedder: words and word bigrams are hashed into
+    `dim` signed buckets (the hashing trick) with log-scaled term counts.
+    Same text, same vector — on every machine and across restarts.
+    """
+
+    def __init__(self, dim: int):
+        self.dim = dim
+
+    def _bucket(self, token: str):
+        digest = int.from_bytes(hashlib.blake2b(token.encode("utf-8"), digest_size=8).digest(), "little")
+        return digest % self.dim, 1.0 if (digest >> 63) & 1 else -1.0
+
+    def embed(self, texts: List[str]) -> np.ndarray:
+        vectors = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            words = _TOKEN.findall(text.lower())
+            tokens = words + [f"{a} {b}" for a, b in zip(words, words[1:])]
+            counts = {}
+            for token in tokens:
+                counts[token] = counts.get(token, 0) + 1
+            for token, count in counts.items():
+                bucket, sign = self._bucket(token)
+                vectors[row, bucket] += sign * (1.0 + math.log(count))
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return vectors / norms
+
+
+@lru_cache(maxsize=1)
+def get_embedder() -> Embedder:
+    """
+    EMBEDDER is "hashing" or "package.module:ClassName" for a custom Embedder
+    whose constructor takes the dimension.
+    """
+    if settings.EMBEDDER == "hashing":
+        return HashingEmbedder(settings.EMBEDDING_DIM)
+    module_name, _, class_name = settings.EMBEDDER.partition(":")
+    embedder_class = getattr(importlib.import_module(module_name), class_name)
+    return embedder_class(settings.EMBEDDING_DIM)
@@ -0,0 +1,145 @@
+# src/utils/execution.py
+import asyncio
+import logging
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from datetime import datetime, timedelta
+from typing import Optional
+from src.core.config import settings
+from src.models.outbox import OutboxEvent
+
+logger = logging.getLogger(__name__)
+
+
+class ExecutionBackend:
+    """
+    Runs the Gemini task that send_message writes to the outbox. The outbox row is
+    always written; a backend may claim it to run the task itself, and the relay
+    publishes every row that is still pending once its claim runs out.
+    """
+
+    name = "base"
+
+    def claim(self, event: OutboxEvent) -> bool:
+        """Called before commit. True if dispatch() should run the task after commit."""
+        return False
+
+    def release_claim(self) -> None:
+        """Gives back a claim whose transaction did not commit."""
+
+    def dispatch(self, event_id: int, task_kwargs: dict) -> Optional[Future]:
+        """Starts a claimed task; the future resolves to the task's result."""
+        return None
+
+    async def wait_for_reply(self, future: Future, timeout: float) -> Optional[dict]:
+        """
+        The task result if it finishes within `timeout`, otherwise None (it keeps
+        running). Awaited on the event loop, so a waiting request holds no thread.
+        """
+        try:
+            return await asyncio.wait_for(asyncio.shield(asyncio.wrap_future(future)), timeout)
+        except asyncio.TimeoutError:
+            return None
+        except Exception:
+            # Already logged by the task; the relay will hand it to Celery
+            return None
+
+    async def start(self) -> None:
+        pass
+
+    async def drain(self, timeout: float) -> None:
+        pass
+
+
+class CeleryBackend(ExecutionBackend):
+    """The outbox relay publishes the row and a Celery worker answers it."""
+
+    name = "celery"
+
+
+class InlineBackend(ExecutionBackend):
+    """
+    Answers in the API process: each task is an asyncio task on the server's
+    loop, with the blocking Gemini and DB calls on a pool of INLINE_CONCURRENCY
+    threads. Beyond INLINE_MAX_PENDING queued tasks, new ones go to Celery.
+    """
+
+    name = "inline"
+
+    def __init__(self, concurrency: int, max_pending: int):
+        self.concurrency = concurrency
+        self.max_pending = max_pending
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._pending = 0
+        self._lock = threading.Lock()
+        self._accepting = False
+
+    async def start(self) -> None:
+        self._loop = asyncio.get_running_loop()
+        self._executor = ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix="inline-gemini")
+        self._accepting = True
+        logger.info(f"⚡ Inline execution backend started ({self.concurrency} concurrent)")
+
+    def claim(self, event: OutboxEvent) -> bool:
+        with self._lock:
+            if not self._accepting or self._pending >= self.max_pending:
+                return False
+            # Counted from the claim, so a burst of requests can't overshoot INLINE_MAX_PENDING
+            self._pending += 1
+        # Hidden from the relay while we run it; published to Celery if we never finish
+        event.available_at = datetime.utcnow() + timedelta(seconds=settings.INLINE_CLAIM_SECONDS)
+        return True
+
+    def release_claim(self) -> None:
+        with self._lock:
+            self._pending -= 1
+
+    def dispatch(self, event_id: int, task_kwargs: dict) -> Optional[Future]:
+        if not self._accepting:
+            # Shutting down since the claim — the relay publishes it once the claim runs out
+            self.release_claim()
+            return None
+        return asyncio.run_coroutine_threadsafe(self._run(event_id, task_kwargs), self._loop)
+
+    async def _run(self, event_id: int, task_kwargs: dict) -> Optional[dict]:
+        # Imported here so the Celery backend never loads the Gemini client in the API
+        from src.utils.gemini import answer_message
+
+        enqueued_at = task_kwargs.get("enqueued_at")
+        lag = max(0.0, time.time() - enqueued_at) if enqueued_at else 0.0
+        try:
+            return await self._loop.run_in_executor(
+                self._executor,
+                lambda: answer_message(**task_kwargs, lag=lag, outbox_event_id=event_id)
+            )
+        except Exception as e:
+            logger.error(f"❌ Inline task for outbox event {event_id} failed, leaving it to the relay: {e}")
+            raise
+        finally:
+            with self._lock:
+                self._pending -= 1
+
+    async def drain(self, timeout: float) -> None:
+        """Stops taking new tasks and waits up to `timeout` for running ones."""
+        self._accepting = False
+        deadline = time.monotonic() + timeout
+        while self._pending and time.monotonic() < deadline:
+            await asyncio.sleep(0.05)
+        if self._pending:
+            logger.warning(f"⚠️ {self._pending} inline task(s) unfinished at shutdown — the outbox relay will retry them")
+        if self._executor:
+            self._executor.shutdown(wait=False)
+        logger.info("👋 Inline execution backend drained")
+
+
+def _create_backend() -> ExecutionBackend:
+    if settings.EXECUTION_BACKEND == "inline":
+        return InlineBackend(settings.INLINE_CONCURRENCY, settings.INLINE_MAX_PENDING)
+    if settings.EXECUTION_BACKEND != "celery":
+        raise ValueError(f"Unknown EXECUTION_BACKEND: {settings.EXECUTION_BACKEND!r}")
+    return CeleryBackend()
+
+
+execution_backend = _create_backend()
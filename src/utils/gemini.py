@@ -0,0 +1,206 @@
+# src/utils/gemini.py
+import time
+from datetime import datetime
+from typing import Optional, Tuple
+import google.generativeai as genai
+from sqlalchemy.exc import IntegrityError, SQLAlchemyError
+from src.core.config import settings
+from src.database.session import SessionLocal
+from src.database.sharding import shard_router
+from src.models import Message, User, Chatroom, OutboxEvent, record_chatroom_message
+from src.utils.usage import record_usage
+from src.utils.cache import invalidate_chatrooms_cache
+from src.utils.admission import refund_daily_quota
+from src.utils.prompt import build_prompt, ensure_indexed, forget_chatroom, index_messages
+
+OVERLOAD_NOTICE = "⚠️ Sorry, I was too busy to answer this in time. Please send your message again."
+USAGE_COMMIT_ATTEMPTS = 3
+
+# Configure Gemini API
+genai.configure(api_key=settings.GEMINI_API_KEY)
+
+
+def generate(prompt: str) -> Tuple[str, int, int]:
+    """(reply text, prompt tokens, completion tokens) from Gemini, or the stub when GEMINI_STUB is set."""
+    if settings.GEMINI_STUB:
+        time.sleep(settings.GEMINI_STUB_LATENCY_MS / 1000)
+        text = f"(stub) You said: {prompt[-200:]}"
+        return text, len(prompt.split()), len(text.split())
+
+    model = genai.GenerativeModel('gemini-2.5-flash')
+    response = model.generate_content(prompt)
+    usage = getattr(response, "usage_metadata", None)
+    prompt_tokens = getattr(usage, "prompt_token_count", 0) or 0
+    completion_tokens = getattr(usage, "candidates_token_count", 0) or 0
+    return response.text, prompt_tokens, completion_tokens
+
+
+def _complete_outbox_event(shard_db, outbox_event_id: Optional[int]) -> None:
+    # An inline run settles its own outbox row, in the same commit as the reply
+    if outbox_event_id is not None:
+        shard_db.query(OutboxEvent).filter(
+            OutboxEvent.id == outbox_event_id,
+            OutboxEvent.status == "pending"
+        ).update({"status": "sent", "sent_at": datetime.utcnow()}, synchronize_session=False)
+
+
+def _already_answered(shard_db, message_id: Optional[int]) -> bool:
+    return message_id is not None and \
+        shard_db.query(Message.id).filter(Message.reply_to_id == message_id).first() is not None
+
+
+def _skip_duplicate(shard_db, message_id: int, outbox_event_id: Optional[int]) -> None:
+    _complete_outbox_event(shard_db, outbox_event_id)
+    shard_db.commit()
+    print(f"⏭️ Message {message_id} already answered, skipping duplicate delivery")
+
+
+def _insert_reply(shard_db, reply: Message, outbox_event_id: Optional[int]) -> bool:
+    """
+    Inserts the reply; False when a concurrent delivery of the same task stored
+    one first (reply_to_id is unique), in which case this one is discarded.
+    Flushing here also takes the reply's id before this task writes to the
+    directory DB, which hands out ids when sharded.
+    """
+    shard_db.add(reply)
+    try:
+        shard_db.flush()
+        return True
+    except IntegrityError:
+        shard_db.rollback()
+        if not _already_answered(shard_db, reply.reply_to_id):
+            raise
+        _skip_duplicate(shard_db, reply.reply_to_id, outbox_event_id)
+        return False
+
+
+def _commit_usage(db, user_id: int, tier: str, prompt_tokens: int, completion_tokens: int) -> None:
+    """
+    Records and commits the usage rollup in the directory DB once the shard has
+    committed the reply. The reply stands either way and a redelivery would skip
+    it, so failures are retried here; after the last attempt the usage is lost.
+    """
+    for attempt in range(1, USAGE_COMMIT_ATTEMPTS + 1):
+        try:
+            record_usage(db, user_id, tier, prompt_tokens, completion_tokens)
+            db.commit()
+            return
+        except SQLAlchemyError as e:
+            db.rollback()
+            if attempt == USAGE_COMMIT_ATTEMPTS:
+                print(f"❌ Usage not recorded for user {user_id} "
+                      f"({prompt_tokens}+{completion_tokens} tokens): {e}")
+                return
+            print(f"⚠️ Usage commit failed for user {user_id}, retrying: {e}")
+            time.sleep(0.2 * attempt)
+
+
+def answer_message(chatroom_id: int, user_id: int, message_id: Optional[int] = None,
+                   message_content: Optional[str] = None, enqueued_at: Optional[float] = None,
+                   lag: float = 0.0, outbox_event_id: Optional[int] = None) -> Optional[dict]:
+    """
+    Generates and stores the assistant's reply to a user message; shared by every
+    execution backend. Delivery is at-least-once, so a message that already has a
+    reply is skipped, and of two concurrent deliveries only the first reply is kept.
+    """
+    db = SessionLocal()
+    shard_db = db
+    try:
+        user = db.query(User).filter(User.id == user_id).first()
+        if not user:
+            print(f"❌ User not found: user={user_id}")
+            return
+
+        shard_db = shard_router.session_for(user, db)
+        # Commits pin the user's reads to the primary, as for their own requests — otherwise a
+        # dashboard read right after the reply could cache a replica's stale chatroom summary
+        db.info["subject"] = shard_db.info["subject"] = user.mobile_number
+        chatroom = shard_db.query(Chatroom).filter(Chatroom.id == chatroom_id).first()
+
+        if not chatroom:
+            print(f"❌ Chatroom not found: user={user_id}, chatroom={chatroom_id}")
+            forget_chatroom(user_id, chatroom_id)
+            return
+
+        user_message = None
+        if message_id is not None:
+            if _already_answered(shard_db, message_id):
+                _skip_duplicate(shard_db, message_id, outbox_event_id)
+                return
+            user_message = shard_db.query(Message).filter(Message.id == message_id).first()
+            if not user_message:
+                print(f"❌ Message not found: message={message_id}")
+                return
+            message_content = user_message.full_content
+
+        # 🚦 Too late to be useful — answer with a notice instead of calling Gemini
+        if lag > settings.TASK_MAX_AGE_SECONDS:
+            shard_router.confirm_placement(db, user, shard_db)
+            refund_daily_quota(user, enqueued_at)
+            notice = Message(is_from_user=False, chatroom_id=chatroom_id, user_id=user_id, reply_to_id=message_id)
+            notice.set_content(OVERLOAD_NOTICE)
+            if not _insert_reply(shard_db, notice, outbox_event_id):
+                return
+            record_chatroom_message(shard_db, chatroom_id, OVERLOAD_NOTICE)
+            _complete_outbox_event(shard_db, outbox_event_id)
+            shard_db.commit()
+            if shard_db is not db:
+                db.commit()
+            invalidate_chatrooms_cache(str(user_id))
+            print(f"⚠️ Dropped message {message_id} after {lag:.0f}s in queue, quota refunded")
+            return {"success": False, "shed": True, "message_id": notice.id}
+
+        prompt = message_content
+        if user_message is not None:
+            try:
+                ensure_indexed(shard_db, user_id, chatroom_id, user_message.id)
+                index_messages(user_id, chatroom_id, [user_message])
+                prompt = build_prompt(shard_db, user_id, chatroom_id, user_message, message_content)
+            except Exception as e:
+                # Context is an improvement, not a requirement — answer the bare message
+                print(f"⚠️ Prompt context unavailable for chatroom {chatroom_id}: {e}")
+
+        # Nothing is written yet — end the read transactions so the Gemini call holds no connection
+        shard_db.commit()
+        db.commit()
+        text, prompt_tokens, completion_tokens = generate(prompt)
+
+        # The Gemini call may have outlasted a move's drain — make sure the shard is still ours
+        shard_router.confirm_placement(db, user, shard_db)
+
+        ai_message = Message(
+            is_from_user=False,
+            chatroom_id=chatroom_id,
+            user_id=user_id,
+            reply_to_id=message_id,
+            prompt_tokens=prompt_tokens,
+            completion_tokens=completion_tokens
+        )
+        ai_message.set_content(text)
+        if not _insert_reply(shard_db, ai_message, outbox_event_id):
+            return
+        record_chatroom_message(shard_db, chatroom_id, text)
+        _complete_outbox_event(shard_db, outbox_event_id)
+        if shard_db is db:
+            # Not sharded: the rollup commits in the same transaction as the reply
+            record_usage(db, user_id, user.subscription_tier, prompt_tokens, completion_tokens)
+            db.commit()
+        else:
+            # Rollups live in the directory DB; the placement lock is held until the reply commits
+            tier = user.subscription_tier
+            shard_db.commit()
+            _commit_usage(db, user_id, tier, prompt_tokens, completion_tokens)
+        shard_db.refresh(ai_message)
+        invalidate_chatrooms_cache(str(user_id))
+        try:
+            index_messages(user_id, chatroom_id, [ai_message])
+        except Exception as e:
+            print(f"⚠️ Failed to index reply {ai_message.id}: {e}")
+
+        print(f"✅ AI response saved for chatroom {chatroom_id}: {text[:50]}...")
+        return {"success": True, "message_id": ai_message.id}
+
+    finally:
+        if shard_db is not db:
+            shard_db.close()
+        db.close()
@@ -0,0 +1,130 @@
+# src/utils/idempotency.py
+import asyncio
+import hashlib
+import json
+import logging
+import secrets
+import time
+from typing import Any, Callable, Optional, Tuple
+from fastapi import HTTPException, status
+from redis.client import Pipeline
+from redis.exceptions import RedisError, WatchError
+from starlette.concurrency import run_in_threadpool
+from src.core.config import settings
+from src.utils.cache import redis_client
+
+logger = logging.getLogger(__name__)
+
+REPLAYED_HEADER = "Idempotent-Replayed"
+POLL_SECONDS = 0.05
+
+
+def request_fingerprint(*parts) -> str:
+    """Hash of what the request asks for — a key reused for something else is rejected."""
+    return hashlib.sha256(json.dumps(parts, default=str).encode("utf-8")).hexdigest()
+
+
+class Idempotency:
+    """
+    One Idempotency-Key for one user and endpoint, backed by a Redis record:
+
+        pending  — claimed with SET NX for IDEMPOTENCY_LOCK_SECONDS while the request runs
+        done     — the 2xx response, kept for IDEMPOTENCY_TTL_SECONDS
+
+    A duplicate that arrives while the first is pending waits for it rather than
+    running in parallel. Failed requests release the key so a retry runs again.
+    Completing and releasing only touch the record while it still holds our token.
+    Without a key, or with Redis down, requests run unguarded.
+    """
+
+    def __init__(self, key: Optional[str], user_id: int, scope: str, fingerprint: str):
+        self.redis_key = f"idempotency:{user_id}:{scope}:{key}" if key else None
+        self.fingerprint = fingerprint
+        self.token = secrets.token_hex(8)
+        self.claimed = False
+
+    async def start(self, on_wait: Optional[Callable[[], None]] = None) -> Optional[Tuple[int, Any]]:
+        """
+        Claims the key (None), or returns the original request's (status, body).
+        While a duplicate is pending this polls on the event loop, so the wait holds
+        no threadpool thread; `on_wait` runs once before the first poll, e.g. to end
+        the caller's read transaction so the wait holds no DB connection either.
+        """
+        if self.redis_key is None:
+            return None
+        deadline = time.monotonic() + settings.IDEMPOTENCY_WAIT_SECONDS
+        try:
+            while True:
+                found, stored = await run_in_threadpool(self._claim_or_read)
+                if found:
+                    return stored
+                if time.monotonic() >= deadline:
+                    raise HTTPException(
+                        status_code=status.HTTP_409_CONFLICT,
+                        detail="A request with this Idempotency-Key is still in progress.",
+                        headers={"Retry-After": "1"}
+                    )
+                if on_wait is not None:
+                    await run_in_threadpool(on_wait)
+                    on_wait = None
+                await asyncio.sleep(POLL_SECONDS)
+        except RedisError as e:
+            # Fail open — a Redis outage should not block chats
+            logger.warning(f"⚠️ Idempotency check unavailable, processing without it: {e}")
+            return None
+
+    def _claim_or_read(self) -> Tuple[bool, Optional[Tuple[int, Any]]]:
+        """One attempt: (True, None) claimed, (True, response) done, (False, None) still pending."""
+        pending = json.dumps({"state": "pending", "fingerprint": self.fingerprint, "token": self.token})
+        while True:
+            if redis_client.set(self.redis_key, pending, nx=True, ex=settings.IDEMPOTENCY_LOCK_SECONDS):
+                self.claimed = True
+                return True, None
+            raw = redis_client.get(self.redis_key)
+            if raw is not None:
+                break  # otherwise released or expired in between — try to claim it again
+        record = json.loads(raw)
+        if record["fingerprint"] != self.fingerprint:
+            raise HTTPException(
+                status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                detail="Idempotency-Key was already used for a different request."
+            )
+        if record["state"] == "done":
+            return True, (record["status"], record["body"])
+        return False, None
+
+    def _if_still_ours(self, write: Callable[[Pipeline], None]) -> None:
+        # WATCH/MULTI: the write is dropped if the key changed after we read our token,
+        # e.g. our claim expired and a retry claimed the key in between
+        with redis_client.pipeline() as pipe:
+            try:
+                pipe.watch(self.redis_key)
+                raw = pipe.get(self.redis_key)
+                if raw is None or json.loads(raw).get("token") != self.token:
+                    return
+                pipe.multi()
+                write(pipe)
+                pipe.execute()
+            except WatchError:
+                pass
+
+    def complete(self, status_code: int, body: Any) -> None:
+        """Stores the response, unless our claim expired and the key moved on."""
+        if not self.claimed:
+            return
+        record = {"state": "done", "fingerprint": self.fingerprint, "status": status_code, "body": body}
+        try:
+            self._if_still_ours(
+                lambda pipe: pipe.setex(self.redis_key, settings.IDEMPOTENCY_TTL_SECONDS, json.dumps(record))
+            )
+        except RedisError as e:
+            logger.warning(f"⚠️ Could not store idempotent response: {e}")
+
+    def release(self) -> None:
+        """Drops our pending claim after a failure (not someone else's after ours expired)."""
+        if not self.claimed:
+            return
+        try:
+            self._if_still_ours(lambda pipe: pipe.delete(self.redis_key))
+        except RedisError as e:
+            logger.warning(f"⚠️ Could not release idempotency key: {e}")
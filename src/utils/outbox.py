@@ -0,0 +1,18 @@
+# src/utils/outbox.py
+import json
+from sqlalchemy.orm import Session
+from src.models.outbox import OutboxEvent
+
+# Celery task names — pinned in src/celery_app.py so the API never imports the worker
+GEMINI_TASK = "src.celery_app.process_gemini_message"
+
+
+def enqueue_task(db: Session, task_name: str, user_id: int, **kwargs) -> OutboxEvent:
+    """
+    Adds a task to the outbox in the caller's transaction — it is published by the
+    relay (src/outbox_relay.py) only if that transaction commits.
+    """
+    payload = json.dumps({"user_id": user_id, **kwargs})
+    event = OutboxEvent(task_name=task_name, payload=payload, user_id=user_id)
+    db.add(event)
+    return event
@@ -0,0 +1,232 @@
+# src/utils/profiling.py
+import json
+import logging
+import os
+import random
+import re
+import sys
+import threading
+import time
+from collections import Counter
+from contextvars import ContextVar
+from datetime import datetime
+from typing import Dict, List, Optional, Set
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from starlette.concurrency import run_in_threadpool
+from src.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+DEBUG_HEADER = "X-Debug-Profile"
+
+# Profile of the request/task running in this context; None almost always
+_current: ContextVar[Optional["Profile"]] = ContextVar("profile", default=None)
+
+# Thread id -> profile of the work it last ran SQL for (None when unprofiled). Request
+# profiles sample only their own threads, since threadpool threads serve every request.
+_thread_owner: Dict[int, Optional["Profile"]] = {}
+
+# "IN (?, ?, ?)" and friends collapse to one shape regardless of list length
+_PLACEHOLDER_LIST = re.compile(r"\(\s*(\?|%\(\w+\)s|\$\d+)(\s*,\s*(\?|%\(\w+\)s|\$\d+))+\s*\)")
+_WHITESPACE = re.compile(r"\s+")
+
+
+def query_shape(statement: str) -> str:
+    """Normalizes a SQL statement so repeats of the same query compare equal."""
+    shape = _WHITESPACE.sub(" ", statement).strip()
+    return _PLACEHOLDER_LIST.sub("(...)", shape)
+
+
+def _fold(frame) -> List[str]:
+    """Root-to-leaf frame labels for a folded (flame graph) stack."""
+    labels = []
+    while frame is not None:
+        code = frame.f_code
+        filename = os.path.relpath(code.co_filename, PROJECT_ROOT) \
+            if code.co_filename.startswith(PROJECT_ROOT) else os.path.basename(code.co_filename)
+        labels.append(f"{code.co_name} ({filename}:{code.co_firstlineno})")
+        frame = frame.f_back
+    labels.reverse()
+    return labels
+
+
+def _in_project(label: str) -> bool:
+    return (" (src/" in label or " (app.py:" in label) and " (src/utils/profiling.py:" not in label
+
+
+class Profile:
+    """
+    Sampling profiler plus SQL trace for one request or Celery task.
+
+    A daemon thread samples stacks every PROFILE_INTERVAL_MS. Tasks pin it to the
+    worker thread. Requests run on threadpool threads we can't name up front, so
+    they sample the threads whose latest SQL query was this request's, while
+    those threads are inside project code; concurrent requests stay out.
+    """
+
+    def __init__(self, name: str, thread_ids: Optional[Set[int]] = None):
+        self.name = name
+        self.thread_ids = thread_ids
+        self.stacks: Counter = Counter()
+        self.queries: List[Dict] = []
+        self.started = time.perf_counter()
+        self.duration_ms = 0.0
+        self._stop = threading.Event()
+        self._sampler = threading.Thread(target=self._sample, name=f"profiler:{name}", daemon=True)
+
+    def start(self) -> "Profile":
+        self._sampler.start()
+        return self
+
+    def stop(self) -> None:
+        self.duration_ms = (time.perf_counter() - self.started) * 1000
+        self._stop.set()
+        self._sampler.join()
+
+    def _sample(self) -> None:
+        interval = settings.PROFILE_INTERVAL_MS / 1000
+        me = threading.get_ident()
+        while not self._stop.wait(interval):
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == me:
+                    continue
+                if self.thread_ids is not None and thread_id not in self.thread_ids:
+                    continue
+                if self.thread_ids is None and _thread_owner.get(thread_id) is not self:
+                    continue
+                labels = _fold(frame)
+                if self.thread_ids or any(_in_project(label) for label in labels):
+                    self.stacks[";".join(labels)] += 1
+
+    def record_query(self, statement: str, seconds: float) -> None:
+        self.queries.append({"shape": query_shape(statement), "ms": round(seconds * 1000, 3)})
+
+    def findings(self) -> Dict:
+        counts = Counter(q["shape"] for q in self.queries)
+        repeated = [
+            {
+                "shape": shape,
+                "count": count,
+                "total_ms": round(sum(q["ms"] for q in self.queries if q["shape"] == shape), 3),
+            }
+            for shape, count in counts.most_common()
+            if count >= settings.N_PLUS_ONE_THRESHOLD
+        ]
+        return {
+            "query_count": len(self.queries),
+            "over_query_budget": len(self.queries) > settings.QUERY_COUNT_BUDGET,
+            "n_plus_one": repeated,
+        }
+
+    def save(self) -> str:
+        """
+        Writes <stem>.folded (flamegraph.pl / speedscope input) and <stem>.json
+        (timings, SQL trace, findings) to PROFILE_DIR. Returns the stem.
+        """
+        os.makedirs(settings.PROFILE_DIR, exist_ok=True)
+        slug = re.sub(r"[^A-Za-z0-9]+", "-", self.name).strip("-")
+        stem = f"{datetime.utcnow().strftime('%Y%m%dT%H%M%S%f')}-{slug}"
+        base = os.path.join(settings.PROFILE_DIR, stem)
+
+        with open(f"{base}.folded", "w") as f:
+            for stack, count in self.stacks.items():
+                f.write(f"{stack} {count}\n")
+
+        findings = self.findings()
+        with open(f"{base}.json", "w") as f:
+            json.dump({
+                "name": self.name,
+                "duration_ms": round(self.duration_ms, 3),
+                "samples": sum(self.stacks.values()),
+                **findings,
+                "queries": self.queries,
+            }, f, indent=2)
+
+        if findings["n_plus_one"]:
+            top = findings["n_plus_one"][0]
+            logger.warning(f"⚠️ Possible N+1 in {self.name}: {top['count']}x {top['shape'][:120]}")
+        if findings["over_query_budget"]:
+            logger.warning(f"⚠️ {self.name} ran {findings['query_count']} queries (budget {settings.QUERY_COUNT_BUDGET})")
+        logger.info(f"📊 Saved profile {stem} ({self.duration_ms:.1f} ms, {findings['query_count']} queries)")
+        return stem
+
+
+def profiling_enabled() -> bool:
+    return settings.PROFILE_SAMPLE_RATE > 0 or bool(settings.PROFILE_DEBUG_TOKEN)
+
+
+def _sampled() -> bool:
+    return settings.PROFILE_SAMPLE_RATE > 0 and random.random() < settings.PROFILE_SAMPLE_RATE
+
+
+# --- SQL TRACE ---
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    profile = _current.get()
+    _thread_owner[threading.get_ident()] = profile
+    if profile is not None:
+        conn.info.setdefault("profile_query_start", []).append(time.perf_counter())
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    profile = _current.get()
+    if profile is not None and conn.info.get("profile_query_start"):
+        profile.record_query(statement, time.perf_counter() - conn.info["profile_query_start"].pop())
+
+def install_sql_trace() -> None:
+    """Hooks every engine (directory, shards, replicas). Costs a ContextVar lookup and a dict write per query."""
+    if not event.contains(Engine, "before_cursor_execute", _before_cursor_execute):
+        event.listen(Engine, "before_cursor_execute", _before_cursor_execute)
+        event.listen(Engine, "after_cursor_execute", _after_cursor_execute)
+
+
+# --- FASTAPI ---
+async def profile_requests(request, call_next):
+    """HTTP middleware — profiles sampled requests and those with a valid debug header."""
+    forced = bool(settings.PROFILE_DEBUG_TOKEN) and \
+        request.headers.get(DEBUG_HEADER) == settings.PROFILE_DEBUG_TOKEN
+    if not forced and not _sampled():
+        return await call_next(request)
+
+    profile = Profile(f"{request.method} {request.url.path}").start()
+    token = _current.set(profile)
+    try:
+        response = await call_next(request)
+    finally:
+        _current.reset(token)
+        profile.stop()
+
+    route = request.scope.get("route")
+    if route is not None:
+        profile.name = f"{request.method} {route.path}"
+    response.headers["X-Profile-Id"] = await run_in_threadpool(profile.save)
+    return response
+
+def install_request_profiler(app) -> None:
+    if profiling_enabled():
+        install_sql_trace()
+        app.middleware("http")(profile_requests)
+
+
+# --- CELERY ---
+_task_profiles: Dict[str, tuple] = {}
+
+def _start_task_profile(task_id=None, task=None, **kwargs):
+    if _sampled():
+        profile = Profile(f"task {task.name}", thread_ids={threading.get_ident()}).start()
+        _task_profiles[task_id] = (profile, _current.set(profile))
+
+def _stop_task_profile(task_id=None, **kwargs):
+    entry = _task_profiles.pop(task_id, None)
+    if entry:
+        profile, token = entry
+        _current.reset(token)
+        profile.stop()
+        profile.save()
+
+def install_task_profiler() -> None:
+    if settings.PROFILE_SAMPLE_RATE > 0:
+        from celery.signals import task_prerun, task_postrun
+        install_sql_trace()
+        task_prerun.connect(_start_task_profile, weak=False)
+        task_postrun.connect(_stop_task_profile, weak=False)
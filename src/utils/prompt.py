@@ -0,0 +1,89 @@
+# src/utils/prompt.py
+from typing import List, Optional
+from sqlalchemy.orm import Session, selectinload
+from src.core.config import settings
+from src.models import Message
+from src.utils.compression import make_preview
+from src.utils.embeddings import get_embedder
+from src.utils.vector_index import get_vector_index
+
+BACKFILL_BATCH = 1000
+
+
+def index_messages(user_id: int, chatroom_id: int, messages: List[Message]) -> None:
+    """Embeds messages and appends them to the chatroom's vector index."""
+    if messages:
+        vectors = get_embedder().embed([m.full_content for m in messages])
+        get_vector_index().add(user_id, chatroom_id, [m.id for m in messages], vectors)
+
+
+def forget_chatroom(user_id: int, chatroom_id: int) -> None:
+    """Deletes a deleted room's index files; failing to is logged, never raised."""
+    try:
+        get_vector_index().drop(user_id, chatroom_id)
+    except OSError as e:
+        print(f"⚠️ Failed to remove vector index of chatroom {chatroom_id}: {e}")
+
+
+def ensure_indexed(db: Session, user_id: int, chatroom_id: int, before_id: int) -> None:
+    """
+    Catches the room's index up to `before_id`: whole histories that predate the
+    index, and messages this process did not index itself (other worker hosts,
+    inline runs in the API, shed messages and their notices).
+    """
+    last_id = get_vector_index().last_id(user_id, chatroom_id)
+    while True:
+        batch = db.query(Message).options(selectinload(Message.body)).filter(
+            Message.chatroom_id == chatroom_id,
+            Message.id > last_id,
+            Message.id < before_id
+        ).order_by(Message.id).limit(BACKFILL_BATCH).all()
+        if not batch:
+            return
+        index_messages(user_id, chatroom_id, batch)
+        last_id = batch[-1].id
+
+
+def _turn(message: Message) -> str:
+    speaker = "User" if message.is_from_user else "Assistant"
+    return f"{speaker}: {make_preview(message.full_content, settings.PROMPT_SNIPPET_CHARS)}"
+
+
+def build_prompt(db: Session, user_id: int, chatroom_id: int, user_message: Optional[Message],
+                 message_content: str) -> str:
+    """
+    The user's message plus context: the last PROMPT_HISTORY_MESSAGES turns and,
+    when the room is longer than that, the PROMPT_RETRIEVED_MESSAGES older turns
+    most similar to the new message. Without history the prompt is the message.
+    """
+    if user_message is None:
+        return message_content
+
+    recent = db.query(Message).options(selectinload(Message.body)).filter(
+        Message.chatroom_id == chatroom_id,
+        Message.id < user_message.id
+    ).order_by(Message.id.desc()).limit(settings.PROMPT_HISTORY_MESSAGES).all()[::-1]
+    if not recent:
+        return message_content
+
+    retrieved = []
+    if settings.PROMPT_RETRIEVED_MESSAGES and len(recent) == settings.PROMPT_HISTORY_MESSAGES:
+        hits = get_vector_index().search(
+            user_id, chatroom_id,
+            get_embedder().embed([message_content])[0],
+            settings.PROMPT_RETRIEVED_MESSAGES,
+            exclude={m.id for m in recent} | {user_message.id},
+            min_score=settings.RETRIEVAL_MIN_SCORE
+        )
+        if hits:
+            retrieved = db.query(Message).options(selectinload(Message.body)).filter(
+                Message.chatroom_id == chatroom_id,
+                Message.id.in_([message_id for message_id, _ in hits])
+            ).order_by(Message.id).all()
+
+    sections = ["Continue this conversation by replying to the user's latest message."]
+    if retrieved:
+        sections.append("Relevant earlier messages:\n" + "\n".join(_turn(m) for m in retrieved))
+    sections.append("Recent conversation:\n" + "\n".join(_turn(m) for m in recent))
+    sections.append(f"User: {message_content}")
+    return "\n\n".join(sections)
@@ -0,0 +1,149 @@
+# src/utils/traffic.py
+"""
+Opt-in traffic capture for load replay (scripts/replay_traffic.py).
+
+With TRAFFIC_CAPTURE_FILE set, every request adds one JSON line:
+
+    {"t": 1760839200123, "m": "POST", "r": "/chatroom/{chatroom_id}/message",
+     "a": "5f1c0d9e2b7a", "p": {"chatroom_id": "a41e77c0913d"}, "q": {},
+     "b": 58, "s": 202, "d": 41.7}
+
+t start (epoch ms) · m method · r route template · a actor · p path ids ·
+q allow-listed query params · b request body bytes · s status · d duration ms.
+
+Actors and ids are keyed HMACs (TRAFFIC_CAPTURE_KEY, random per process when
+unset), so one user's requests stay linked without recording who they are.
+Bodies, tokens and mobile numbers are never written.
+"""
+import atexit
+import hashlib
+import hmac
+import json
+import logging
+import os
+import random
+import threading
+import time
+from typing import Optional
+from src.core.config import settings
+from src.core.security import decode_subject
+
+logger = logging.getLogger(__name__)
+
+# Query parameters whose values say something about load, not about the user
+CAPTURED_QUERY_PARAMS = {"preview", "period", "day"}
+# Auth routes carry the mobile number in the body instead of a token
+AUTH_BODY_ROUTES = {"/auth/signup", "/auth/send-otp", "/auth/verify-otp", "/auth/forgot-password"}
+MAX_AUTH_BODY_BYTES = 4096
+FLUSH_BYTES = 64 * 1024
+FLUSH_SECONDS = 1.0
+
+
+class TrafficRecorder:
+    """Buffers capture lines and appends them with single O_APPEND writes, so several
+    worker processes can share one file without interleaving lines."""
+
+    def __init__(self, path: str, key: bytes):
+        self.path = path
+        self.key = key
+        self._fd = os.open(path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o600)
+        self._buffer = []
+        self._buffered = 0
+        self._flushed_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    def pseudonym(self, value: str) -> str:
+        return hmac.new(self.key, value.encode("utf-8"), hashlib.sha256).hexdigest()[:12]
+
+    def sampled(self, actor: Optional[str]) -> bool:
+        # Sample whole actors so a kept user's request sequence stays complete
+        rate = settings.TRAFFIC_CAPTURE_SAMPLE_RATE
+        if rate >= 1:
+            return True
+        if actor is None:
+            return random.random() < rate
+        return int(actor[:8], 16) / 0xFFFFFFFF < rate
+
+    def write(self, record: dict) -> None:
+        line = json.dumps(record, separators=(",", ":")) + "\n"
+        with self._lock:
+            self._buffer.append(line)
+            self._buffered += len(line)
+            if self._buffered >= FLUSH_BYTES or time.monotonic() - self._flushed_at >= FLUSH_SECONDS:
+                self._flush_locked()
+
+    def flush(self) -> None:
+        with self._lock:
+            self._flush_locked()
+
+    def _flush_locked(self) -> None:
+        if self._buffer:
+            os.write(self._fd, "".join(self._buffer).encode("utf-8"))
+            self._buffer, self._buffered = [], 0
+        self._flushed_at = time.monotonic()
+
+
+_recorder: Optional[TrafficRecorder] = None
+
+
+async def _mobile_from_body(request) -> Optional[str]:
+    if int(request.headers.get("content-length") or 0) > MAX_AUTH_BODY_BYTES:
+        return None
+    try:
+        return json.loads(await request.body()).get("mobile_number")
+    except (ValueError, AttributeError):
+        return None
+
+
+async def capture_requests(request, call_next):
+    """HTTP middleware — records the shape and timing of each request."""
+    started = time.time()
+    start = time.perf_counter()
+
+    mobile = None
+    authorization = request.headers.get("authorization", "")
+    if authorization.lower().startswith("bearer "):
+        try:
+            mobile = decode_subject(authorization[7:])
+        except Exception:
+            pass
+    elif request.method == "POST" and request.url.path in AUTH_BODY_ROUTES:
+        mobile = await _mobile_from_body(request)
+
+    actor = _recorder.pseudonym(f"user:{mobile}") if mobile else None
+    if not _recorder.sampled(actor):
+        return await call_next(request)
+
+    status_code = 500
+    try:
+        response = await call_next(request)
+        status_code = response.status_code
+        return response
+    finally:
+        route = request.scope.get("route")
+        _recorder.write({
+            "t": int(started * 1000),
+            "m": request.method,
+            "r": route.path if route is not None else None,
+            "a": actor,
+            "p": {name: _recorder.pseudonym(f"{name}:{value}")
+                  for name, value in request.path_params.items()},
+            "q": {name: value for name, value in request.query_params.items()
+                  if name in CAPTURED_QUERY_PARAMS},
+            "b": int(request.headers.get("content-length") or 0),
+            "s": status_code,
+            "d": round((time.perf_counter() - start) * 1000, 2),
+        })
+
+
+def install_traffic_capture(app) -> None:
+    global _recorder
+    if settings.TRAFFIC_CAPTURE_FILE:
+        # Every worker process must share the key, or one user becomes several actors in the replay
+        key = settings.TRAFFIC_CAPTURE_KEY.encode("utf-8") or hmac.new(
+            settings.SECRET_KEY.encode("utf-8"), b"traffic-capture", hashlib.sha256
+        ).digest()
+        _recorder = TrafficRecorder(settings.TRAFFIC_CAPTURE_FILE, key)
+        atexit.register(_recorder.flush)
+        app.middleware("http")(capture_requests)
+        logger.info(f"📼 Capturing traffic to {settings.TRAFFIC_CAPTURE_FILE}")
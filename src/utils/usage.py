@@ -0,0 +1,106 @@
+# src/utils/usage.py
+from datetime import date, datetime
+from typing import Dict, Optional
+from sqlalchemy import func
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session
+from src.core.config import settings
+from src.models.usage import UsageRollup, TierUsageRollup
+
+PERIODS = ("day", "month")
+
+
+def period_start(period: str, day: date) -> date:
+    return day if period == "day" else day.replace(day=1)
+
+
+def monthly_token_limit(tier: str) -> int:
+    """Monthly token quota for a tier; 0 means unlimited."""
+    return settings.PRO_MONTHLY_TOKEN_LIMIT if tier == "Pro" else settings.BASIC_MONTHLY_TOKEN_LIMIT
+
+
+def record_usage(db: Session, user_id: int, tier: str, prompt_tokens: int, completion_tokens: int,
+                 when: Optional[datetime] = None) -> None:
+    """
+    Adds one exchange to the user's day and month rollups, and to their tier's,
+    with one upsert per table. A user's first exchange in a period also counts
+    them as an active user of the tier.
+    Not committed — the caller commits alongside the AI message. When sharded the
+    rollup lives in the directory DB and commits after the reply's shard commit;
+    the worker retries that commit, but if it keeps failing the exchange is never
+    counted (redeliveries skip answered messages), so rollups can undercount.
+    """
+    day = (when or datetime.utcnow()).date()
+    totals = {
+        "message_count": 1,
+        "prompt_tokens": prompt_tokens,
+        "completion_tokens": completion_tokens,
+        "total_tokens": prompt_tokens + completion_tokens,
+    }
+    starts = {period: period_start(period, day) for period in PERIODS}
+
+    dialect = db.get_bind().dialect.name
+    if dialect in ("postgresql", "sqlite"):
+        insert = postgresql.insert if dialect == "postgresql" else sqlite.insert
+
+        def upsert(model, rows, keys):
+            stmt = insert(model).values(rows)
+            table = model.__table__
+            return stmt.on_conflict_do_update(
+                index_elements=keys,
+                set_={
+                    column: table.c[column] + stmt.excluded[column]
+                    for column in rows[0] if column not in keys
+                } | {"updated_at": func.now()},
+            )
+
+        # The upsert returns the row as updated — a count of 1 means it was just created
+        user_rows = [{"user_id": user_id, "tier": tier, "period": period, "period_start": starts[period], **totals}
+                     for period in PERIODS]
+        first_in = dict(db.execute(
+            upsert(UsageRollup, user_rows, ["user_id", "period", "period_start", "tier"])
+            .returning(UsageRollup.period, UsageRollup.message_count == 1)
+        ).all())
+        tier_rows = [{"tier": tier, "period": period, "period_start": starts[period],
+                      "active_users": int(first_in[period]), **totals}
+                     for period in PERIODS]
+        db.execute(upsert(TierUsageRollup, tier_rows, ["period", "period_start", "tier"]))
+        return
+
+    # Other databases: read-modify-write under a row lock
+    for period in PERIODS:
+        keys = {"tier": tier, "period": period, "period_start": starts[period]}
+        rollup = db.query(UsageRollup).filter_by(user_id=user_id, **keys).with_for_update().first()
+        tier_rollup = db.query(TierUsageRollup).filter_by(**keys).with_for_update().first()
+        if tier_rollup is None:
+            tier_rollup = TierUsageRollup(**keys, active_users=0, **{column: 0 for column in totals})
+            db.add(tier_rollup)
+        if rollup is None:
+            rollup = UsageRollup(user_id=user_id, **keys, **{column: 0 for column in totals})
+            db.add(rollup)
+            tier_rollup.active_users += 1
+        for row in (rollup, tier_rollup):
+            for column, amount in totals.items():
+                setattr(row, column, getattr(row, column) + amount)
+
+
+def get_period_usage(db: Session, user_id: int, period: str, day: Optional[date] = None) -> Dict:
+    """The user's totals for one period — an indexed lookup of at most one row per tier."""
+    start = period_start(period, day or datetime.utcnow().date())
+    totals = db.query(
+        func.coalesce(func.sum(UsageRollup.message_count), 0),
+        func.coalesce(func.sum(UsageRollup.prompt_tokens), 0),
+        func.coalesce(func.sum(UsageRollup.completion_tokens), 0),
+        func.coalesce(func.sum(UsageRollup.total_tokens), 0),
+    ).filter(
+        UsageRollup.user_id == user_id,
+        UsageRollup.period == period,
+        UsageRollup.period_start == start,
+    ).one()
+    return {
+        "period_start": start.isoformat(),
+        "messages": totals[0],
+        "prompt_tokens": totals[1],
+        "completion_tokens": totals[2],
+        "total_tokens": totals[3],
+    }
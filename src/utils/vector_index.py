@@ -0,0 +1,203 @@
+# src/utils/vector_index.py
+import glob
+import os
+from collections import OrderedDict
+from contextlib import contextmanager
+from functools import lru_cache
+from typing import Iterable, List, Optional, Tuple
+import numpy as np
+from src.core.config import settings
+
+try:
+    import fcntl
+except ImportError:  # Windows — appends are unlocked, so run a single worker (--pool=solo)
+    fcntl = None
+
+# 256-bit SimHash codes pick candidates; exact float32 scores rank them.
+# At 100k rows 2048 candidates find ~92% of the exact top 5 (bench_vector_index.py).
+CODE_BITS = 256
+CODE_WORDS = CODE_BITS // 64
+# Named by width, so changing CODE_BITS rebuilds the codes instead of misreading them
+CODES = f".codes{CODE_BITS}"
+EXACT_SEARCH_ROWS = 4096
+MIN_CANDIDATES = 2048
+CANDIDATES_PER_RESULT = 16
+REBUILD_CHUNK_ROWS = 65536
+HYPERPLANE_SEED = 20240917
+MAPPED_ROOMS = 64
+
+
+@lru_cache(maxsize=4)
+def _hyperplanes(dim: int) -> np.ndarray:
+    return np.random.default_rng(HYPERPLANE_SEED).standard_normal((dim, CODE_BITS)).astype(np.float32)
+
+
+def simhash(vectors: np.ndarray) -> np.ndarray:
+    """(n, dim) float32 -> (n, CODE_WORDS) uint64 sign-of-random-projection codes."""
+    bits = (vectors @ _hyperplanes(vectors.shape[1])) > 0
+    return np.packbits(bits, axis=1, bitorder="little").view(np.uint64)
+
+
+def _mapped(path: str, dtype, shape) -> np.ndarray:
+    # Plain ndarray view of a read-only memmap; slicing np.memmap itself is slow
+    return np.memmap(path, dtype=dtype, mode="r", shape=shape).view(np.ndarray)
+
+
+class VectorIndex:
+    """
+    Append-only embedding index, one set of files per (user, chatroom):
+
+        <root>/<user_id>/<chatroom_id>.f32    float32 vectors, n x dim
+        <root>/<user_id>/<chatroom_id>.codes256  uint64 SimHash codes, n x CODE_WORDS
+        <root>/<user_id>/<chatroom_id>.ids    int64 message ids, n
+
+    Files are memory-mapped for search. The ids file is appended last and
+    defines how many rows are complete, so readers never need a lock. Codes
+    missing for some rows (another CODE_BITS wrote them) are rebuilt from the
+    vectors under the room's lock.
+    """
+
+    def __init__(self, root: str, dim: int):
+        self.root = root
+        self.dim = dim
+        # Recently searched rooms stay mapped; a fresh mmap page-faults on every touch
+        self._maps = OrderedDict()
+
+    def _base(self, user_id: int, chatroom_id: int) -> str:
+        return os.path.join(self.root, str(user_id), str(chatroom_id))
+
+    def count(self, user_id: int, chatroom_id: int) -> int:
+        path = self._base(user_id, chatroom_id) + ".ids"
+        return os.path.getsize(path) // 8 if os.path.exists(path) else 0
+
+    def last_id(self, user_id: int, chatroom_id: int) -> int:
+        """Highest message id in the room's index, 0 when it is empty."""
+        n = self.count(user_id, chatroom_id)
+        return int(self._map(self._base(user_id, chatroom_id), n)[0].max()) if n else 0
+
+    @contextmanager
+    def _locked(self, base: str):
+        os.makedirs(os.path.dirname(base), exist_ok=True)
+        with open(base + ".lock", "a") as lock:
+            if fcntl:
+                fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                if fcntl:
+                    fcntl.flock(lock, fcntl.LOCK_UN)
+
+    def _codes_complete(self, base: str, rows: int) -> bool:
+        path = base + CODES
+        return rows == 0 or (os.path.exists(path) and os.path.getsize(path) >= rows * CODE_WORDS * 8)
+
+    def _rebuild_codes(self, base: str, rows: int) -> None:
+        # Caller holds the lock; readers see the old file until the new one replaces it
+        vectors = _mapped(base + ".f32", np.float32, (rows, self.dim))
+        with open(base + CODES + ".tmp", "wb") as f:
+            for start in range(0, rows, REBUILD_CHUNK_ROWS):
+                f.write(simhash(vectors[start:start + REBUILD_CHUNK_ROWS]).tobytes())
+        os.replace(base + CODES + ".tmp", base + CODES)
+        for stale in glob.glob(glob.escape(base) + ".codes*"):
+            if stale != base + CODES:
+                os.remove(stale)
+
+    def add(self, user_id: int, chatroom_id: int, message_ids: List[int], vectors: np.ndarray) -> None:
+        if not message_ids:
+            return
+        vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+        base = self._base(user_id, chatroom_id)
+
+        with self._locked(base):
+            # Keep rows aligned if an earlier append died halfway through
+            rows = self.count(user_id, chatroom_id)
+            if not self._codes_complete(base, rows):
+                self._rebuild_codes(base, rows)
+            for suffix, data, row_bytes in (
+                (".f32", vectors, self.dim * 4),
+                (CODES, simhash(vectors), CODE_WORDS * 8),
+                (".ids", np.asarray(message_ids, dtype=np.int64), 8),
+            ):
+                with open(base + suffix, "ab") as f:
+                    f.truncate(rows * row_bytes)
+                    f.write(data.tobytes())
+
+    def drop(self, user_id: int, chatroom_id: int) -> None:
+        """Deletes the room's files, e.g. once the chatroom itself is deleted."""
+        base = self._base(user_id, chatroom_id)
+        self._maps.pop(base, None)
+        for path in glob.glob(glob.escape(base) + ".*"):
+            os.remove(path)
+        try:
+            os.rmdir(os.path.dirname(base))
+        except OSError:
+            pass  # the user's other rooms are still there
+
+    def _map(self, base: str, n: int):
+        cached = self._maps.get(base)
+        if cached is None or cached[0] != n:
+            if not self._codes_complete(base, n):
+                with self._locked(base):
+                    if not self._codes_complete(base, n):
+                        self._rebuild_codes(base, n)
+            cached = (n,
+                      _mapped(base + ".ids", np.int64, (n,)),
+                      _mapped(base + ".f32", np.float32, (n, self.dim)),
+                      _mapped(base + CODES, np.uint64, (n, CODE_WORDS)))
+            self._maps[base] = cached
+            if len(self._maps) > MAPPED_ROOMS:
+                self._maps.popitem(last=False)
+        self._maps.move_to_end(base)
+        return cached[1:]
+
+    def search(self, user_id: int, chatroom_id: int, query: np.ndarray, k: int,
+               exclude: Iterable[int] = (), min_score: Optional[float] = None) -> List[Tuple[int, float]]:
+        """Top-k (message_id, cosine score) for a normalized query vector."""
+        n = self.count(user_id, chatroom_id)
+        if n == 0 or k <= 0:
+            return []
+        ids, vectors, codes = self._map(self._base(user_id, chatroom_id), n)
+        query = np.asarray(query, dtype=np.float32)
+        exclude = set(exclude)
+        want = k + len(exclude)
+
+        if n <= EXACT_SEARCH_ROWS:
+            candidates = np.arange(n)
+        else:
+            # Hamming distance on SimHash codes approximates angle; keep the closest few hundred.
+            # Column-wise XOR is several times faster than broadcasting over the 2-D array.
+            query_code = simhash(query[None, :])[0]
+            # uint8 per word; the sum needs uint16 once CODE_BITS passes 255
+            distance = np.bitwise_count(codes[:, 0] ^ query_code[0]).astype(np.uint16)
+            for word in range(1, CODE_WORDS):
+                distance += np.bitwise_count(codes[:, word] ^ query_code[word])
+            budget = max(want * CANDIDATES_PER_RESULT, MIN_CANDIDATES)
+            histogram = np.cumsum(np.bincount(distance, minlength=CODE_BITS + 1))
+            cutoff = int(np.searchsorted(histogram, budget))
+            # Everything closer than the cutoff, then ties at the cutoff up to the budget
+            closer = np.flatnonzero(distance < cutoff)
+            ties = np.flatnonzero(distance == cutoff)[:budget - len(closer)]
+            candidates = np.concatenate((closer, ties))
+
+        scores = vectors[candidates] @ query
+        if len(candidates) > want:
+            top = np.argpartition(-scores, want)[:want]
+        else:
+            top = np.arange(len(candidates))
+        top = top[np.argsort(-scores[top])]
+
+        results = []
+        for i in top:
+            message_id, score = int(ids[candidates[i]]), float(scores[i])
+            if message_id in exclude or (min_score is not None and score < min_score):
+                continue
+            results.append((message_id, score))
+            exclude.add(message_id)  # a redelivered task may have indexed a row twice
+            if len(results) == k:
+                break
+        return results
+
+
+@lru_cache(maxsize=1)
+def get_vector_index() -> VectorIndex:
+    return VectorIndex(settings.VECTOR_INDEX_DIR, settings.EMBEDDING_DIM)